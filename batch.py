@@ -0,0 +1,387 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from collections import deque
+import numpy as np
+
+from cells import EMPTY, WALL, SNAKE, BONUS, KIND, KIND_BITS, ID_DTYPE, MAX_SNAKES, GOOD_BONUS, MILD_BONUS, snake_cell
+from pytron import DEFAULT_WALLS, DEFAULT_ROSTER, LOOKAHEAD, Grid, Snake
+
+# Moves for each direction. 0: Up // 1: Right // 2: Down // 3: Left
+DIR_X = np.array([0, 1, 0, -1])
+DIR_Y = np.array([1, 0, -1, 0])
+# Lookahead distances drawn by CPUs.
+CPU_LOOKAHEAD = np.array(LOOKAHEAD)
+
+# BatchGrid
+class BatchGrid:
+    """
+    Many independent grids advanced together, following the rules of Grid.update_grid.
+    All the games share the same size, walls and roster. Their cells are stored into stacked arrays
+    indexed by [game, y, x] and their snakes into arrays indexed by [game, snake], so a tick of every
+    game is a few array operations per snake instead of a Python loop per game.
+    As with Grid, the cells of each snake are kept oldest first so that expiring them does not need to look at
+    the whole grids: here into ring buffers indexed by [game, snake, cell].
+    Only 'cpu', 'drone' and 'human' snakes are supported, humans going straight ahead.
+    """
+
+    def __init__(self, games: int, width: int, height: int, roster: list = DEFAULT_ROSTER, walls: list = DEFAULT_WALLS,
+                 single_life: bool = False, bonus_timeout: int = 74, seed: int = None):
+        """
+        Creates the games and places their walls and snakes.
+            :param self:
+            :param games:int: Number of games.
+            :param width:int: Width of the grids.
+            :param height:int: Height of the grids.
+            :param roster:list: Snakes of each game, as (type, keys, color) tuples. Keys and colors are ignored.
+            :param walls:list: Walls of each game, as (bottom_left, top_right) tuples.
+            :param single_life:bool: Whether snakes are removed on their first death. Games are then reset when they end.
+            :param bonus_timeout:int: Age at which bonuses disappear.
+            :param seed:int: Seed of the random generator.
+        """
+        self.games = games
+        self.width = width
+        self.height = height
+        self.single_life = single_life
+        self.bonus_timeout = bonus_timeout
+        self.random = np.random.default_rng(seed)
+        self.tick = 0
+
+        self.types = [snakeType for snakeType, keys, color in roster]
+        for snakeType in self.types:
+            if snakeType not in ('cpu', 'drone', 'human'):
+                raise ValueError("Snake type %s is not supported by the batch grid." % snakeType)
+        if len(self.types) > MAX_SNAKES:
+            raise ValueError("A grid holds at most %d snakes." % MAX_SNAKES)
+        self.drone = np.array([snakeType == 'drone' for snakeType in self.types], dtype=bool)
+        self.cpu = np.array([snakeType == 'cpu' for snakeType in self.types], dtype=bool)
+        self.min_tail, self.max_tail, self.default_tail = np.array(
+            [Snake.tail_limits(snakeType) for snakeType in self.types], dtype=np.int64).reshape(-1, 3).T
+        self.cpu_ai = np.array(Snake.cpu_ai)
+        self.cpu_avoid = np.array(Snake.cpu_avoid)
+        self.bonus = np.array(Grid.bonus)
+
+        self.walls = np.zeros((height, width), dtype=bool)
+        for bottom_left, top_right in walls:
+            self.walls[bottom_left[1]:top_right[1] + 1, bottom_left[0]:top_right[0] + 1] = True
+
+        self.ids = np.zeros((games, height, width), dtype=ID_DTYPE)
+        self.births = np.zeros((games, height, width), dtype=np.int64)
+        # Flat views of the cells, indexed by [game, y * width + x].
+        self.flat_ids = self.ids.reshape(games, -1)
+        self.flat_births = self.births.reshape(games, -1)
+        # (tick, games, cells) of the bonuses, oldest first.
+        self.bonus_cells = deque()
+
+        shape = (games, len(self.types))
+        self.x = np.zeros(shape, dtype=np.int64)
+        self.y = np.zeros(shape, dtype=np.int64)
+        self.new_x = np.zeros(shape, dtype=np.int64)
+        self.new_y = np.zeros(shape, dtype=np.int64)
+        self.dir = np.zeros(shape, dtype=np.int64)
+        self.new_dir = np.zeros(shape, dtype=np.int64)
+        self.tail = np.zeros(shape, dtype=np.int64)
+        self.reset = np.zeros(shape, dtype=bool)
+        self.kill = np.zeros(shape, dtype=np.int64)
+        self.dead = np.zeros(shape, dtype=np.int64)
+        self.score = np.zeros(shape, dtype=np.int64)
+
+        # Ring buffers of the cells of the snakes, holding flat cells and births. A body holds at most
+        # tail + 2 cells before expiring, plus the cell the snake was placed on at the start of a match.
+        # body_start and body_end only grow, cells are at their value modulo the capacity.
+        self.capacity = int(self.max_tail.max(initial=0)) + 3
+        self.body_cells = np.zeros(shape + (self.capacity,), dtype=np.int64)
+        self.body_births = np.zeros(shape + (self.capacity,), dtype=np.int64)
+        self.body_start = np.zeros(shape, dtype=np.int64)
+        self.body_end = np.zeros(shape, dtype=np.int64)
+
+        # Heads of the snakes which moved this tick and are still on the grid, as Grid.update_grid hashes them:
+        # the last snake (+1) whose head is on each cell, and for each snake the previous one on its cell, 0 ending.
+        self.heads = np.zeros((games, height * width), dtype=np.int32)
+        self.next_head = np.zeros(shape, dtype=np.int32)
+
+        # Counters of the last match each game ended, and number of matches ended, for single life.
+        self.final_kill = np.zeros(shape, dtype=np.int64)
+        self.final_dead = np.zeros(shape, dtype=np.int64)
+        self.final_score = np.zeros(shape, dtype=np.int64)
+        self.matches = np.zeros(games, dtype=np.int64)
+
+        self.reset_games(np.ones(games, dtype=bool))
+
+    def reset_games(self, games: np.ndarray):
+        """
+        Starts a new match into some games: the grids only keep their walls and the snakes are placed at random.
+            :param self:
+            :param games:np.ndarray: Boolean mask of the games to reset.
+        """
+        g = np.flatnonzero(games)
+        if len(g) == 0:
+            return
+        self.ids[g] = np.where(self.walls, WALL, EMPTY)
+        self.births[g] = 0
+        for s in range(len(self.types)):
+            x, y, found = self.random_points(g)
+            if not found.all():
+                raise ValueError("No empty cell left for a new snake.")
+            self.x[g, s] = x
+            self.y[g, s] = y
+            self.new_x[g, s] = x
+            self.new_y[g, s] = y
+            self.dir[g, s] = self.random.integers(0, 4, len(g))
+            self.new_dir[g, s] = self.dir[g, s]
+            self.ids[g, y, x] = snake_cell(s + 1)
+            self.births[g, y, x] = self.tick
+            self.body_start[g, s] = 0
+            self.body_end[g, s] = 0
+            self.push_body(g, s, y * self.width + x)
+        self.tail[g] = self.default_tail
+        self.reset[g] = False
+        self.kill[g] = 0
+        self.dead[g] = 0
+        self.score[g] = 0
+
+    def random_points(self, g: np.ndarray) -> tuple:
+        """
+        Returns random empty coordinates into some games, as (x, y, found) arrays.
+        found is False for the games without any empty cell.
+            :param self:
+            :param g:np.ndarray: Indexes of the games.
+        """
+        keys = self.random.random((len(g), self.width * self.height))
+        keys[self.ids[g].reshape(len(g), -1) != EMPTY] = -1
+        cells = keys.argmax(axis=1)
+        found = keys[np.arange(len(g)), cells] >= 0
+        y, x = np.divmod(cells, self.width)
+        return x, y, found
+
+    def show_bonus(self):
+        """
+        Adds (or not) a bonus on each grid.
+            :param self:
+        """
+        b = self.bonus[self.random.integers(0, len(self.bonus), self.games)]
+        g = np.flatnonzero(b != 0)
+        if len(g) == 0:
+            return
+        x, y, found = self.random_points(g)
+        g, x, y = g[found], x[found], y[found]
+        self.ids[g, y, x] = b[g]
+        self.births[g, y, x] = self.tick
+        self.bonus_cells.append((self.tick, g, y * self.width + x))
+
+    def step(self) -> np.ndarray:
+        """
+        Advances every game by one tick. In single life, games which ended are reset afterwards
+        and their counters are kept into final_kill, final_dead and final_score.
+        Returns the boolean mask of the games which ended.
+            :param self:
+        """
+        self.show_bonus()
+        # As Grid.update_grid, every snake chooses its direction before any of them moves.
+        playing = [self.playing(s) for s in range(len(self.types))]
+        for s, g in enumerate(playing):
+            if len(g) > 0:
+                self.select_new_direction(g, s)
+        for s, g in enumerate(playing):
+            if len(g) > 0:
+                self.move_snake(g, s)
+        self.heads[np.arange(self.games)[:, None], self.new_y * self.width + self.new_x] = 0
+        self.expire_cells()
+
+        done = self.ended()
+        if done.any():
+            self.final_kill[done] = self.kill[done]
+            self.final_dead[done] = self.dead[done]
+            self.final_score[done] = self.score[done]
+            self.matches[done] += 1
+            self.reset_games(done)
+        return done
+
+    def ended(self) -> np.ndarray:
+        """
+        Returns the boolean mask of the games whose match ended: in single life, when at most one
+        non drone snake is left (none if there was only one).
+            :param self:
+        """
+        players = ~self.drone
+        if not self.single_life or not players.any():
+            return np.zeros(self.games, dtype=bool)
+        alive = (~self.reset[:, players]).sum(axis=1)
+        return alive < min(2, players.sum())
+
+    def select_new_direction(self, g: np.ndarray, s: int):
+        """
+        Chooses the new direction of a snake into some games, the way Snake.select_new_direction does.
+            :param self:
+            :param g:np.ndarray: Indexes of the games.
+            :param s:int: Index of the snake.
+        """
+        d = self.dir[g, s]
+        if self.drone[s]:
+            self.new_dir[g, s] = self.cpu_ai[d, self.random.integers(0, self.cpu_ai.shape[1], len(g))]
+        elif self.cpu[s]:
+            distance = CPU_LOOKAHEAD[self.random.integers(0, len(CPU_LOOKAHEAD), len(g))]
+            avoid_x = (self.x[g, s] + DIR_X[d] * distance) % self.width
+            avoid_y = (self.y[g, s] + DIR_Y[d] * distance) % self.height
+            state = self.ids[g, avoid_y, avoid_x]
+
+            new_dir = self.new_dir[g, s]
+            ai = self.cpu_ai[d, self.random.integers(0, self.cpu_ai.shape[1], len(g))]
+            avoid = self.cpu_avoid[d, self.random.integers(0, self.cpu_avoid.shape[1], len(g))]
+            kind = state & KIND
+            new_dir = np.where(state == EMPTY, ai, new_dir)
+            new_dir = np.where((kind == SNAKE) | (state == WALL), avoid, new_dir)
+            new_dir = np.where(kind == BONUS, d, new_dir)
+            self.new_dir[g, s] = new_dir
+
+    def kill_snake(self, g: np.ndarray, s: int, remove: bool):
+        """
+        Resets the tail of a snake which died into some games, and removes it in single life.
+            :param self:
+            :param g:np.ndarray: Indexes of the games.
+            :param s:int: Index of the snake.
+            :param remove:bool: Whether the snake is removed in single life.
+        """
+        self.reset[g, s] = True
+        self.tail[g, s] = self.default_tail[s]
+        self.dead[g, s] += 1
+        if self.single_life and remove:
+            self.tail[g, s] = 0
+            self.x[g, s] = -1
+            self.y[g, s] = -1
+
+    def playing(self, s: int) -> np.ndarray:
+        """
+        Returns the indexes of the games where a snake plays this tick: all of them but, in single life,
+        those where it was removed.
+            :param self:
+            :param s:int: Index of the snake.
+        """
+        if self.single_life and not self.drone[s]:
+            return np.flatnonzero(~self.reset[:, s])
+        return np.arange(self.games)
+
+    def move_snake(self, g: np.ndarray, s: int):
+        """
+        Moves a snake into the games where it is playing, in its new direction, and resolves its collisions.
+            :param self:
+            :param g:np.ndarray: Indexes of the games.
+            :param s:int: Index of the snake.
+        """
+        self.reset[g, s] = False
+        self.dir[g, s] = self.new_dir[g, s]
+        d = self.dir[g, s]
+        # As Snake.move, from the last new position, which a drone removed on a wall keeps.
+        new_x = (self.new_x[g, s] + DIR_X[d]) % self.width
+        new_y = (self.new_y[g, s] + DIR_Y[d]) % self.height
+        self.new_x[g, s] = new_x
+        self.new_y[g, s] = new_y
+
+        # Head to head collisions with previously moved snakes, following the snakes hashed on the cell.
+        cells = new_y * self.width + new_x
+        gj, j = g, self.heads[g, cells] - 1
+        while True:
+            gj, j = gj[j >= 0], j[j >= 0]
+            if len(j) == 0:
+                break
+            live = self.x[gj, j] >= 0
+            for other in np.unique(j[live]):
+                hit = gj[live & (j == other)]
+                self.kill_snake(hit, s, not self.drone[s])
+                self.kill_snake(hit, other, not self.drone[other])
+            j = self.next_head[gj, j] - 1
+
+        self.x[g, s] = new_x
+        self.y[g, s] = new_y
+        state = self.ids[g, new_y, new_x]
+
+        kind = state & KIND
+        snake = kind == SNAKE
+        bonus = kind == BONUS
+        wall = state == WALL
+        if self.drone[s]:
+            place = (state == EMPTY) | snake | bonus
+        else:
+            place = (state == EMPTY) | bonus
+            killer = snake & (state != snake_cell(s + 1))
+            self.kill_snake(g[snake], s, True)
+            np.add.at(self.kill, (g[killer], (state[killer] >> KIND_BITS).astype(np.int64) - 1), 1)
+
+        self.ids[g[place], new_y[place], new_x[place]] = snake_cell(s + 1)
+        self.births[g[place], new_y[place], new_x[place]] = self.tick
+        self.push_body(g[place], s, new_y[place] * self.width + new_x[place])
+        # Even drones are removed when hitting a wall in single life.
+        self.kill_snake(g[wall], s, True)
+
+        # Hashing the head where the snake is still on the grid.
+        kept = self.x[g, s] >= 0
+        self.next_head[g[kept], s] = self.heads[g[kept], cells[kept]]
+        self.heads[g[kept], cells[kept]] = s + 1
+
+        # Bonus eaten, as Snake.edit_tail.
+        good = g[state == GOOD_BONUS]
+        self.score[good, s] += 1
+        self.tail[good, s] = np.minimum(self.tail[good, s] + 10, self.max_tail[s])
+        mild = g[state == MILD_BONUS]
+        self.score[mild, s] += 2
+        self.tail[mild, s] = np.maximum(self.tail[mild, s] - 5, self.min_tail[s])
+
+    def push_body(self, g: np.ndarray, s: int, cells: np.ndarray):
+        """
+        Adds the new head of a snake to its body into some games.
+            :param self:
+            :param g:np.ndarray: Indexes of the games.
+            :param s:int: Index of the snake.
+            :param cells:np.ndarray: Flat cells of the heads.
+        """
+        i = self.body_end[g, s] % self.capacity
+        self.body_cells[g, s, i] = cells
+        self.body_births[g, s, i] = self.tick
+        self.body_end[g, s] += 1
+
+    def clear_cells(self, g: np.ndarray, states: np.ndarray, cells: np.ndarray, births: np.ndarray):
+        """
+        Resets cells of some games, only where they still hold what was set at the given ticks.
+            :param self:
+            :param g:np.ndarray: Indexes of the games.
+            :param states:np.ndarray: Ids the cells were set with.
+            :param cells:np.ndarray: Flat cells.
+            :param births:np.ndarray: Ticks at which the cells were set.
+        """
+        same = (self.flat_ids[g, cells] == states) & (self.flat_births[g, cells] == births)
+        self.flat_ids[g[same], cells[same]] = EMPTY
+        self.flat_births[g[same], cells[same]] = 0
+
+    def expire_cells(self):
+        """
+        Clears the snake and bonus cells which expired into every game, as Grid.expire_cells.
+            :param self:
+        """
+        # Snakes which were reset lose all their cells.
+        g, s = np.nonzero(self.reset & (self.body_end > self.body_start))
+        if len(g) > 0:
+            length = self.body_end[g, s] - self.body_start[g, s]
+            offsets = np.arange(length.max())
+            valid = offsets < length[:, None]
+            i = (self.body_start[g, s][:, None] + offsets) % self.capacity
+            g, s, i = (np.broadcast_to(a, valid.shape)[valid] for a in (g[:, None], s[:, None], i))
+            self.clear_cells(g, snake_cell(s + 1), self.body_cells[g, s, i], self.body_births[g, s, i])
+            self.body_start[self.reset] = self.body_end[self.reset]
+
+        # The others lose their cells older than their tail, a few at most.
+        while True:
+            i = self.body_start % self.capacity
+            front = np.take_along_axis(self.body_births, i[:, :, None], axis=2)[:, :, 0]
+            g, s = np.nonzero((self.body_end > self.body_start) & (self.tick - front > self.tail))
+            if len(g) == 0:
+                break
+            i = i[g, s]
+            self.clear_cells(g, snake_cell(s + 1), self.body_cells[g, s, i], self.body_births[g, s, i])
+            self.body_start[g, s] += 1
+
+        while self.bonus_cells and self.tick - self.bonus_cells[0][0] > self.bonus_timeout:
+            birth, g, cells = self.bonus_cells.popleft()
+            states = self.flat_ids[g, cells]
+            bonus = states & KIND == BONUS
+            self.clear_cells(g[bonus], states[bonus], cells[bonus], np.full(bonus.sum(), birth))
+
+        self.tick += 1
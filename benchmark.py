@@ -0,0 +1,202 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from random import Random
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import numpy as np
+
+from pytron import make_game
+from tournament import make_roster
+
+# What each mode times, tick by tick:
+# grid: Grid.update_grid alone, game: Game.run_once, render: Game.run_once then a frame of the window,
+# frame: a frame of the window alone, the game not moving.
+MODES = ('grid', 'game', 'render', 'frame')
+# Grid sizes of the default sweep, quick enough to run on every change, and the large ones added by --full.
+QUICK_SIZES = [(72, 48), (200, 200)]
+FULL_SIZES = [(500, 500), (2000, 2000)]
+
+
+def random_walls(width: int, height: int, density: float, seed: int) -> list:
+    """
+    Returns one cell walls covering a fraction of the grid, at random.
+        :param width:int: Width of the grid.
+        :param height:int: Height of the grid.
+        :param density:float: Fraction of the cells which are walls.
+        :param seed:int: Seed of the walls.
+    """
+    cells = Random(seed).sample(range(width * height), int(width * height * density))
+    return [((cell % width, cell // width), (cell % width, cell // width)) for cell in cells]
+
+
+def run_case(case: dict, ticks: int, warmup: int, seed: int) -> dict:
+    """
+    Times one case of the sweep and returns its results: ticks per second and latency percentiles in microseconds.
+    Cases which cannot run here, such as drawn ones without Pyglet or a display, are returned as skipped.
+        :param case:dict: Width, height, snakes, type, density, single_life and mode of the case.
+        :param ticks:int: Number of ticks timed.
+        :param warmup:int: Number of ticks run before timing.
+        :param seed:int: Seed of the game and the walls.
+    """
+    mode = case['mode']
+    drawn = mode in ('render', 'frame')
+    try:
+        game = make_game(case['width'], case['height'], 0, 1, draw = drawn, single_life = case['single_life'],
+                         walls = random_walls(case['width'], case['height'], case['density'], seed),
+                         roster = make_roster([case['type']] * case['snakes']), seed = seed)
+    except Exception as error:  # pylint: disable=broad-except
+        if not drawn:
+            raise
+        return {'case': case, 'skipped': "%s: %s" % (type(error).__name__, error)}
+
+    grid = game.grid
+    renderer = game.renderer
+    if mode == 'grid':
+        def tick():
+            grid.show_bonus()
+            grid.update_grid(game.single_life)
+    elif mode == 'game':
+        tick = game.run_once
+    elif mode == 'render':
+        def tick():
+            game.run_once()
+            renderer.begin_frame()
+            renderer.end_frame(grid)
+    else:
+        def tick():
+            renderer.begin_frame()
+            renderer.end_frame(grid)
+
+    latencies = np.empty(ticks, dtype=np.int64)
+    for i in range(warmup):
+        tick()
+    start = time.perf_counter_ns()
+    for i in range(ticks):
+        before = time.perf_counter_ns()
+        tick()
+        latencies[i] = time.perf_counter_ns() - before
+    elapsed = time.perf_counter_ns() - start
+    game.close()
+    if renderer is not None:
+        renderer.win.close()
+
+    p50, p90, p99 = np.percentile(latencies, (50, 90, 99)) / 1000
+    return {
+        'case': case,
+        'ticks': ticks,
+        'ticks_per_second': ticks / (elapsed / 1e9),
+        'latency_us': {'p50': p50, 'p90': p90, 'p99': p99, 'max': latencies.max() / 1000}
+    }
+
+
+def sweep(sizes: list, snakes: list, types: list, densities: list, single_lives: list, modes: list) -> list:
+    """
+    Returns every combination of the parameters, as case dictionaries.
+        :param sizes:list: (width, height) of the grids.
+        :param snakes:list: Numbers of snakes.
+        :param types:list: Types of the snakes, all the snakes of a case having the same.
+        :param densities:list: Fractions of the cells which are walls.
+        :param single_lives:list: Single life settings.
+        :param modes:list: What is timed, among MODES.
+    """
+    return [{'width': width, 'height': height, 'snakes': count, 'type': snakeType, 'density': density,
+             'single_life': single_life, 'mode': mode}
+            for (width, height), count, snakeType, density, single_life, mode
+            in itertools.product(sizes, snakes, types, densities, single_lives, modes)]
+
+
+def case_key(case: dict) -> str:
+    """
+    Returns a key identifying a case, to match results across runs.
+        :param case:dict: Case of the sweep.
+    """
+    return json.dumps(case, sort_keys=True)
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """
+    Compares results to a baseline, case by case. Returns (case, baseline ticks per second, ticks per second, ratio)
+    tuples for the cases slower than the baseline by more than the tolerance.
+        :param results:list: Results of this run.
+        :param baseline:list: Results of the baseline run.
+        :param tolerance:float: Fraction of the baseline throughput which may be lost.
+    """
+    reference = {case_key(result['case']): result for result in baseline if 'skipped' not in result}
+    regressions = []
+    for result in results:
+        before = reference.get(case_key(result['case']))
+        if before is None or 'skipped' in result:
+            continue
+        ratio = result['ticks_per_second'] / before['ticks_per_second']
+        result['baseline_ratio'] = ratio
+        if ratio < 1 - tolerance:
+            regressions.append((result['case'], before['ticks_per_second'], result['ticks_per_second'], ratio))
+    return regressions
+
+
+def parse_size(text: str) -> tuple:
+    width, height = text.lower().split('x')
+    return (int(width), int(height))
+
+
+def parse_bool(text: str) -> list:
+    return {'on': [True], 'off': [False], 'both': [False, True]}[text]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the tick throughput and latency of the game over a sweep of cases.")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=QUICK_SIZES, help="grid sizes, as WIDTHxHEIGHT")
+    parser.add_argument("--full", action="store_true", help="also time the 500x500 and 2000x2000 grids")
+    parser.add_argument("--snakes", type=int, nargs="+", default=[6, 20], help="numbers of snakes")
+    parser.add_argument("--types", nargs="+", default=['cpu', 'drone'],
+                        help="types of the snakes, human ones only driving straight as nobody presses their keys")
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.0, 0.05], help="fractions of the cells which are walls")
+    parser.add_argument("--single-life", type=parse_bool, default=[False], help="on, off or both")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=['grid', 'game'], help="what is timed")
+    parser.add_argument("--ticks", type=int, default=500, help="ticks timed per case")
+    parser.add_argument("--warmup", type=int, default=50, help="ticks run before timing")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the games and walls")
+    parser.add_argument("--out", default=None, help="JSON file of the results, printed if not given")
+    parser.add_argument("--baseline", default=None, help="JSON file of earlier results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="fraction of the baseline throughput which may be lost")
+    args = parser.parse_args()
+    if args.full:
+        args.sizes = args.sizes + [size for size in FULL_SIZES if size not in args.sizes]
+
+    results = []
+    for case in sweep(args.sizes, args.snakes, args.types, args.densities, args.single_life, args.modes):
+        result = run_case(case, args.ticks, args.warmup, args.seed)
+        results.append(result)
+        if 'skipped' in result:
+            print("%-70s skipped (%s)" % (case_key(case), result['skipped']), file=sys.stderr)
+        else:
+            print("%-70s %10.0f ticks/s  p99 %8.0f us" % (case_key(case), result['ticks_per_second'],
+                                                          result['latency_us']['p99']), file=sys.stderr)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)['results'], args.tolerance)
+        for case, before, after, ratio in regressions:
+            print("REGRESSION %s: %.0f -> %.0f ticks/s (x%.2f)" % (case_key(case), before, after, ratio), file=sys.stderr)
+
+    report = {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'ticks': args.ticks, 'warmup': args.warmup, 'seed': args.seed},
+        'results': results
+    }
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump(report, file, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
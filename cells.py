@@ -0,0 +1,37 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+
+# Cell ids are 16 bit integers: the kind of what is on the cell in the two low bits, and the index of that thing
+# in the others, the id of a snake (from 1) or the type of a bonus (from 1).
+# The kind of an id is read with a single mask, and tables indexed by id only need four entries per snake.
+ID_BITS = 16
+ID_MASK = (1 << ID_BITS) - 1
+ID_DTYPE = np.uint16
+KIND_BITS = 2
+KIND = (1 << KIND_BITS) - 1
+EMPTY, WALL, SNAKE, BONUS = range(4)
+# Snake and bonus cells have an age, the two kinds having this bit and the others not.
+AGED = 2
+# Largest snake id.
+MAX_SNAKES = (1 << (ID_BITS - KIND_BITS)) - 1
+# Bonuses: the good one makes the tail longer, the mild one shorter.
+BONUS_TYPES = 2
+GOOD_BONUS = 1 << KIND_BITS | BONUS
+MILD_BONUS = 2 << KIND_BITS | BONUS
+
+
+def snake_cell(snakeId: int) -> int:
+    """
+    Returns the id of the cells of a snake.
+        :param snakeId:int: ID of the snake, from 1.
+    """
+    return snakeId << KIND_BITS | SNAKE
+
+
+def id_count(snakes: int) -> int:
+    """
+    Returns the size of the tables indexed by the cell ids of a grid: every id of its cells is below it.
+        :param snakes:int: Number of snakes of the grid.
+    """
+    return (max(snakes, BONUS_TYPES) + 1) << KIND_BITS
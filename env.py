@@ -0,0 +1,330 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+
+import cells
+from pytron import DEFAULT_WALLS, make_game
+from batch import BatchGrid
+
+# Snakes of the environments, as for make_game. Snakes of type 'human' are the agents, moved by the actions.
+ENV_ROSTER = [
+    ('human', (0, 0, 0, 0), 1),
+    ('cpu', (0, 0, 0, 0), 2),
+    ('cpu', (0, 0, 0, 0), 3),
+    ('cpu', (0, 0, 0, 0), 4),
+    ('drone', (0, 0, 0, 0), 8),
+    ('drone', (0, 0, 0, 0), 8)
+]
+# Planes of the observations. The first ones are one-hot planes of the cells, as seen by an agent.
+EMPTY, WALL, OWN, OTHER, DRONE, GOOD_BONUS, MILD_BONUS, HEAD, AGE = range(9)
+PLANES = 9
+# Ages are divided by this, the longest a snake cell lives, so they stay within [0, 1].
+MAX_AGE = 300
+
+
+# Observations
+class Observations:
+
+    def __init__(self, games: int, types: list, width: int, height: int, crop: int = None):
+        """
+        Preallocated observations of the agents of some games, as a (games, agents, PLANES, height, width) float32 array,
+        or (games, agents, PLANES, 2 * crop + 1, 2 * crop + 1) for crops centered on the heads, wrapping around the grid.
+        Filling them does not allocate any array.
+            :param self:
+            :param games:int: Number of games.
+            :param types:list: Types of the snakes of each game.
+            :param width:int: Width of the grids.
+            :param height:int: Height of the grids.
+            :param crop:int: Distance from the head to the border of the crops, None to observe the whole grids.
+        """
+        self.width = width
+        self.height = height
+        self.crop = crop
+        self.agents = np.array([s for s, snakeType in enumerate(types) if snakeType == 'human'], dtype=np.int64)
+        rows, cols = (height, width) if crop is None else (2 * crop + 1, 2 * crop + 1)
+        shape = (games, len(self.agents), rows, cols)
+        self.obs = np.zeros((games, len(self.agents), PLANES, rows, cols), dtype=np.float32)
+
+        # Plane of each cell id, for each agent, flattened as [agent * ids + id].
+        ids = cells.id_count(len(types))
+        table = np.full((len(self.agents), ids), EMPTY, dtype=np.int64)
+        table[:, cells.WALL] = WALL
+        table[:, cells.BONUS::1 << cells.KIND_BITS] = MILD_BONUS
+        table[:, cells.GOOD_BONUS] = GOOD_BONUS
+        for a, agent in enumerate(self.agents):
+            for s, snakeType in enumerate(types):
+                table[a, cells.snake_cell(s + 1)] = OWN if s == agent else DRONE if snakeType == 'drone' else OTHER
+        self.table = table.reshape(-1)
+        self.table_offset = (np.arange(len(self.agents), dtype=np.int64) * ids)[None, :, None, None]
+
+        # Index of the first cell of each game into the flat cells of all the games.
+        self.game_offset = (np.arange(games, dtype=np.int64) * width * height)[:, None, None, None]
+        self.cells = np.empty(shape, dtype=np.int64)
+        if crop is None:
+            np.add(self.game_offset, np.arange(width * height, dtype=np.int64).reshape(1, 1, height, width), out=self.cells)
+        else:
+            self.offsets = np.arange(-crop, crop + 1, dtype=np.int64)
+            self.rows = np.empty((games, len(self.agents), rows), dtype=np.int64)
+            self.cols = np.empty((games, len(self.agents), cols), dtype=np.int64)
+            # The head is always the center of the crops.
+            self.obs[:, :, HEAD, crop, crop] = 1
+        self.ids = np.empty(shape, dtype=cells.ID_DTYPE)
+        self.planes = np.empty(shape, dtype=np.int64)
+        self.ages = np.empty(shape, dtype=np.int64)
+        self.snake_cells = np.empty(shape, dtype=np.float32)
+        self.game_index = np.arange(games)[:, None]
+        self.agent_index = np.arange(len(self.agents))[None, :]
+        self.head_x = np.zeros((games, len(self.agents)), dtype=np.int64)
+        self.head_y = np.zeros((games, len(self.agents)), dtype=np.int64)
+
+    def fill(self, ids: np.ndarray, births: np.ndarray, tick: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Fills the observations in place and returns them.
+            :param self:
+            :param ids:np.ndarray: Ids of the cells of every game, flat, indexed by [game * width * height + y * width + x].
+            :param births:np.ndarray: Births of the cells, indexed as ids.
+            :param tick:int: Current tick of the games.
+            :param x:np.ndarray: X coord of the heads of every snake, as a (games, snakes) array.
+            :param y:np.ndarray: Y coord of the heads, as x.
+        """
+        np.take(x, self.agents, axis=1, out=self.head_x)
+        np.take(y, self.agents, axis=1, out=self.head_y)
+        if self.crop is not None:
+            np.add(self.head_y[:, :, None], self.offsets, out=self.rows)
+            np.remainder(self.rows, self.height, out=self.rows)
+            np.multiply(self.rows, self.width, out=self.rows)
+            np.add(self.head_x[:, :, None], self.offsets, out=self.cols)
+            np.remainder(self.cols, self.width, out=self.cols)
+            np.add(self.rows[:, :, :, None], self.cols[:, :, None, :], out=self.cells)
+            np.add(self.cells, self.game_offset, out=self.cells)
+
+        np.take(ids, self.cells, out=self.ids)
+        np.add(self.ids, self.table_offset, out=self.planes)
+        np.take(self.table, self.planes, out=self.planes)
+        for plane in range(HEAD):
+            np.equal(self.planes, plane, out=self.obs[:, :, plane])
+        if self.crop is None:
+            self.obs[:, :, HEAD] = 0
+            # Removed snakes, at -1, have no head.
+            self.obs[self.game_index, self.agent_index, HEAD, self.head_y, self.head_x] = self.head_x >= 0
+
+        # Ages of the snake cells only, as the colors of the game fade them.
+        np.take(births, self.cells, out=self.ages)
+        np.subtract(tick, self.ages, out=self.ages)
+        np.multiply(self.ages, 1 / MAX_AGE, out=self.obs[:, :, AGE])
+        np.add(self.obs[:, :, OWN], self.obs[:, :, OTHER], out=self.snake_cells)
+        np.add(self.snake_cells, self.obs[:, :, DRONE], out=self.snake_cells)
+        np.multiply(self.obs[:, :, AGE], self.snake_cells, out=self.obs[:, :, AGE])
+        np.minimum(self.obs[:, :, AGE], 1, out=self.obs[:, :, AGE])
+        return self.obs
+
+
+# PytronEnv
+class PytronEnv:
+
+    def __init__(self, roster: list = ENV_ROSTER, walls: list = DEFAULT_WALLS, width: int = 72, height: int = 48,
+                 single_life: bool = False, max_ticks: int = 1000, crop: int = None, reward_weights: tuple = (1.0, -1.0, 0.5)):
+        """
+        Environment playing one game, where the snakes of type 'human' are the agents.
+        Actions are the directions of the agents, 0: Up // 1: Right // 2: Down // 3: Left. As with the keyboard,
+        turning back is ignored. Rewards are the increases of the kill, dead and score counters of each agent,
+        weighted by reward_weights.
+            :param self:
+            :param roster:list: Snakes, as (type, keys, color) tuples given to Grid.new_snake.
+            :param walls:list: Walls, as (bottom_left, top_right) tuples given to Grid.new_wall.
+            :param width:int: Width of the grid.
+            :param height:int: Height of the grid.
+            :param single_life:bool: Whether snakes are removed on their first death, an agent is then done when removed.
+            :param max_ticks:int: Number of ticks after which the episode ends.
+            :param crop:int: Distance from the head to the border of the observations, None to observe the whole grid.
+            :param reward_weights:tuple: Weights of the kill, dead and score counters.
+        """
+        self.roster = roster
+        self.walls = walls
+        self.width = width
+        self.height = height
+        self.single_life = single_life
+        self.max_ticks = max_ticks
+        self.reward_weights = np.array(reward_weights, dtype=np.float32)
+        self.observations = Observations(1, [snakeType for snakeType, keys, color in roster], width, height, crop)
+        self.agents = self.observations.agents
+        self.counters = np.zeros((len(self.agents), 3), dtype=np.float32)
+        self.values = np.zeros(len(self.agents), dtype=np.float32)
+        self.rewards = np.zeros(len(self.agents), dtype=np.float32)
+        self.dones = np.zeros(len(self.agents), dtype=bool)
+        self.x = np.zeros((1, len(roster)), dtype=np.int64)
+        self.y = np.zeros((1, len(roster)), dtype=np.int64)
+        self.game = None
+
+    def reset(self, seed: int = None) -> np.ndarray:
+        """
+        Starts a new episode and returns the observations, as an (agents, PLANES, rows, cols) array.
+        The observations are overwritten by the next step.
+            :param self:
+            :param seed:int: Seed of the game, None for an unseeded one.
+        """
+        self.game = make_game(self.width, self.height, 0, 1, single_life = self.single_life, array_grid = True,
+                              walls = self.walls, roster = self.roster, seed = seed)
+        self.grid = self.game.grid
+        self.snakes = [self.grid.snakes[agent] for agent in self.agents]
+        self.ticks = 0
+        self.dones[:] = False
+        self.read_counters()
+        return self.observe()
+
+    def read_counters(self):
+        """
+        Reads the kill, dead and score counters of the agents, and their weighted sum into values.
+            :param self:
+        """
+        for a, snake in enumerate(self.snakes):
+            self.counters[a, 0] = snake.kill
+            self.counters[a, 1] = snake.dead
+            self.counters[a, 2] = snake.score
+        np.matmul(self.counters, self.reward_weights, out=self.values)
+
+    def observe(self) -> np.ndarray:
+        """
+        Fills the observations from the grid and returns them.
+            :param self:
+        """
+        for s, snake in enumerate(self.grid.snakes):
+            self.x[0, s] = snake.x
+            self.y[0, s] = snake.y
+        obs = self.observations.fill(self.grid.ids.reshape(-1), self.grid.births.reshape(-1), self.grid.tick, self.x, self.y)
+        return obs[0]
+
+    def step(self, actions) -> tuple:
+        """
+        Moves the agents and runs a tick. Returns the observations, rewards and done flags of the agents.
+        Every agent is done when the episode reaches max_ticks. The returned arrays are overwritten by the next step.
+            :param self:
+            :param actions: Direction of each agent.
+        """
+        for snake, action in zip(self.snakes, actions):
+            action = int(action)
+            if action != (snake.dir + 2) % 4:
+                snake.new_dir = action
+        self.grid.show_bonus()
+        self.grid.update_grid(self.single_life)
+        self.ticks += 1
+
+        np.copyto(self.rewards, self.values)
+        self.read_counters()
+        np.subtract(self.values, self.rewards, out=self.rewards)
+        for a, snake in enumerate(self.snakes):
+            self.dones[a] = self.single_life and snake.x < 0
+        if self.ticks >= self.max_ticks:
+            self.dones[:] = True
+        return self.observe(), self.rewards, self.dones
+
+
+# BatchEnv
+class BatchEnv:
+
+    def __init__(self, games: int, roster: list = ENV_ROSTER, walls: list = DEFAULT_WALLS, width: int = 72, height: int = 48,
+                 single_life: bool = False, max_ticks: int = 1000, crop: int = None, reward_weights: tuple = (1.0, -1.0, 0.5)):
+        """
+        Many environments stepped at once on a BatchGrid, with the same rules as PytronEnv.
+        Each game is reset as soon as its episode ends, so stepping never stops.
+            :param self:
+            :param games:int: Number of games.
+            :param roster:list: Snakes of each game, 'cpu', 'drone' or 'human' ones.
+            :param walls:list: Walls of each game.
+            :param width:int: Width of the grids.
+            :param height:int: Height of the grids.
+            :param single_life:bool: Whether snakes are removed on their first death. An episode then ends with its match.
+            :param max_ticks:int: Number of ticks after which an episode ends.
+            :param crop:int: Distance from the head to the border of the observations, None to observe the whole grids.
+            :param reward_weights:tuple: Weights of the kill, dead and score counters.
+        """
+        self.games = games
+        self.roster = roster
+        self.walls = walls
+        self.width = width
+        self.height = height
+        self.single_life = single_life
+        self.max_ticks = max_ticks
+        self.reward_weights = np.array(reward_weights, dtype=np.float32)
+        self.observations = Observations(games, [snakeType for snakeType, keys, color in roster], width, height, crop)
+        self.agents = self.observations.agents
+        shape = (games, len(self.agents))
+        self.counters = np.zeros(shape + (3,), dtype=np.float32)
+        self.counter = np.zeros(shape, dtype=np.int64)
+        self.values = np.zeros(shape, dtype=np.float32)
+        self.rewards = np.zeros(shape, dtype=np.float32)
+        self.dones = np.zeros(games, dtype=bool)
+        self.ticks = np.zeros(games, dtype=np.int64)
+        self.dirs = np.zeros(shape, dtype=np.int64)
+        self.back = np.zeros(shape, dtype=np.int64)
+        self.turned_back = np.zeros(shape, dtype=bool)
+        self.batch = None
+
+    def reset(self, seed: int = None) -> np.ndarray:
+        """
+        Starts a new episode into every game and returns the observations, as a (games, agents, PLANES, rows, cols) array.
+            :param self:
+            :param seed:int: Seed of the games, None for unseeded ones.
+        """
+        self.batch = BatchGrid(self.games, self.width, self.height, self.roster, self.walls, self.single_life, seed = seed)
+        self.ticks[:] = 0
+        self.dones[:] = False
+        self.read_counters(self.batch.kill, self.batch.dead, self.batch.score)
+        return self.observe()
+
+    def read_counters(self, kill: np.ndarray, dead: np.ndarray, score: np.ndarray):
+        """
+        Reads the counters of the agents, and their weighted sum into values.
+            :param self:
+            :param kill:np.ndarray: Kill counters of every snake, as a (games, snakes) array.
+            :param dead:np.ndarray: Dead counters, as kill.
+            :param score:np.ndarray: Score counters, as kill.
+        """
+        for c, counter in enumerate((kill, dead, score)):
+            np.take(counter, self.agents, axis=1, out=self.counter)
+            self.counters[:, :, c] = self.counter
+        np.matmul(self.counters, self.reward_weights, out=self.values)
+
+    def observe(self) -> np.ndarray:
+        """
+        Fills the observations from the grids and returns them.
+            :param self:
+        """
+        batch = self.batch
+        return self.observations.fill(batch.flat_ids.reshape(-1), batch.flat_births.reshape(-1), batch.tick, batch.x, batch.y)
+
+    def step(self, actions: np.ndarray) -> tuple:
+        """
+        Moves the agents of every game and runs a tick. Returns the observations, the (games, agents) rewards
+        and the (games,) done flags. The games which are done are already reset, and observed from their new start.
+        The returned arrays are overwritten by the next step.
+            :param self:
+            :param actions:np.ndarray: Direction of each agent, as a (games, agents) array.
+        """
+        batch = self.batch
+        np.take(batch.dir, self.agents, axis=1, out=self.dirs)
+        np.add(self.dirs, 2, out=self.back)
+        np.remainder(self.back, 4, out=self.back)
+        np.equal(actions, self.back, out=self.turned_back)
+        np.copyto(self.dirs, actions, where=~self.turned_back)
+        batch.new_dir[:, self.agents] = self.dirs
+
+        np.copyto(self.rewards, self.values)
+        ended = batch.step()
+        self.ticks += 1
+        # The counters of the matches ended by the step were kept by the batch before it reset them.
+        if ended.any():
+            self.read_counters(np.where(ended[:, None], batch.final_kill, batch.kill),
+                               np.where(ended[:, None], batch.final_dead, batch.dead),
+                               np.where(ended[:, None], batch.final_score, batch.score))
+        else:
+            self.read_counters(batch.kill, batch.dead, batch.score)
+        np.subtract(self.values, self.rewards, out=self.rewards)
+
+        np.greater_equal(self.ticks, self.max_ticks, out=self.dones)
+        batch.reset_games(self.dones & ~ended)
+        self.dones |= ended
+        if self.dones.any():
+            self.ticks[self.dones] = 0
+            self.read_counters(batch.kill, batch.dead, batch.score)
+        return self.observe(), self.rewards, self.dones
@@ -0,0 +1,181 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from random import Random
+import math
+import time
+
+
+# Node
+class Node:
+    """
+    Node of the search tree, reached by a sequence of directions of the searching snake.
+    The tree is open loop: the other snakes and the bonuses are drawn again on each rollout.
+    """
+
+    __slots__ = ('visits', 'total', 'children')
+
+    def __init__(self):
+        self.visits = 0
+        self.total = 0.0
+        # Child reached by each direction, None until tried.
+        self.children = [None, None, None, None]
+
+
+# TreeSearch
+class TreeSearch:
+
+    def __init__(self, rng: Random, time_budget: float = 0.02, max_rollouts: int = None, depth: int = 20,
+                 exploration: float = 0.7, single_life: bool = False):
+        """
+        Monte Carlo tree search over the directions of a snake, simulating the game on clones of the grid.
+        The search of a move stops when its time budget is spent or after max_rollouts rollouts.
+        A search only bounded by max_rollouts is reproducible from the seed of the game.
+            :param self:
+            :param rng:Random: Random generator of the searching snake.
+            :param time_budget:float: Seconds spent searching each move, None for no limit.
+            :param max_rollouts:int: Rollouts run for each move, None for no limit.
+            :param depth:int: Number of ticks simulated by a rollout.
+            :param exploration:float: Exploration constant of the UCB formula.
+            :param single_life:bool: Whether snakes are removed on their first death.
+        """
+        if time_budget is None and max_rollouts is None:
+            raise ValueError("A search needs a time budget or a number of rollouts.")
+        self.random = rng
+        self.time_budget = time_budget
+        self.max_rollouts = max_rollouts
+        self.depth = depth
+        self.exploration = exploration
+        self.single_life = single_life
+        # Subtree of the direction taken, reused on the next move, and the tick it is valid for.
+        self.root = None
+        self.root_tick = None
+        # Totals of every search, to measure the speed of the rollouts.
+        self.rollouts = 0
+        self.search_time = 0.0
+
+    def rollouts_per_second(self) -> float:
+        """
+        Returns the number of rollouts run per second of search since the snake was created.
+            :param self:
+        """
+        return self.rollouts / self.search_time if self.search_time > 0 else 0.0
+
+    def search(self, grid, snake) -> int:
+        """
+        Searches the best direction of a snake for the current tick, and keeps its subtree for the next one.
+            :param self:
+            :param grid:Grid: Grid of the game.
+            :param snake:Snake: Searching snake.
+        """
+        start = time.perf_counter()
+        deadline = None if self.time_budget is None else start + self.time_budget
+        root = self.root if self.root_tick == grid.tick and not snake.reset else None
+        if root is None:
+            root = Node()
+
+        # Rollouts all run on one clone, rewound to the grid before each of them.
+        sim = grid.scratch(Random(self.random.getrandbits(64)))
+        rollouts = 0
+        while self.max_rollouts is None or rollouts < self.max_rollouts:
+            if rollouts > 0:
+                grid.rewind(sim, Random(self.random.getrandbits(64)))
+            self.rollout(sim, snake, root)
+            rollouts += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        best = snake.dir
+        best_visits = -1
+        for direction in self.moves(snake.dir):
+            child = root.children[direction]
+            if child is not None and child.visits > best_visits:
+                best, best_visits = direction, child.visits
+        self.root = root.children[best]
+        self.root_tick = grid.tick + 1
+
+        self.rollouts += rollouts
+        self.search_time += time.perf_counter() - start
+        return best
+
+    def moves(self, direction: int) -> tuple:
+        """
+        Returns the directions a snake may take, all but turning back onto itself.
+            :param self:
+            :param direction:int: Current direction of the snake.
+        """
+        return (direction, (direction + 1) % 4, (direction + 3) % 4)
+
+    def rollout(self, sim, snake, root: Node):
+        """
+        Runs one rollout from the root: directions are chosen through the tree down to a new node,
+        then the searching snake plays like a CPU until the depth is reached or it dies.
+        The value is the fraction of the ticks survived, plus the kills and bonuses taken.
+            :param self:
+            :param sim:Grid: Clone of the grid, in the state of the grid, which the rollout plays on.
+            :param snake:Snake: Searching snake.
+            :param root:Node: Root of the tree.
+        """
+        me = sim.snakes[snake.id - 1]
+        kill, dead, score = me.kill, me.dead, me.score
+
+        # Directions chosen by the tree are kept by update_grid, as for human snakes.
+        me.type = 'human'
+        node = root
+        path = [root]
+        ticks = 0
+        alive = True
+        while alive and ticks < self.depth:
+            direction = self.select(node, me.dir)
+            expanded = node.children[direction] is None
+            if expanded:
+                node.children[direction] = Node()
+            node = node.children[direction]
+            path.append(node)
+            me.new_dir = direction
+            alive = self.step(sim, me, dead)
+            ticks += 1
+            if expanded:
+                break
+
+        me.type = 'cpu'
+        while alive and ticks < self.depth:
+            alive = self.step(sim, me, dead)
+            ticks += 1
+
+        survived = ticks if alive else ticks - 1
+        value = survived / self.depth + 0.2 * (me.kill - kill) + 0.1 * (me.score - score)
+        for visited in path:
+            visited.visits += 1
+            visited.total += value
+
+    def select(self, node: Node, direction: int) -> int:
+        """
+        Chooses the direction to follow from a node: an untried one at random, or the best one by UCB.
+            :param self:
+            :param node:Node: Current node.
+            :param direction:int: Current direction of the snake.
+        """
+        moves = self.moves(direction)
+        untried = [move for move in moves if node.children[move] is None]
+        if untried:
+            return self.random.choice(untried)
+        log_visits = math.log(node.visits)
+        best, best_score = moves[0], -1.0
+        for move in moves:
+            child = node.children[move]
+            score = child.total / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best, best_score = move, score
+        return best
+
+    def step(self, sim, me, dead: int) -> bool:
+        """
+        Simulates one tick and returns whether the searching snake is still alive.
+            :param self:
+            :param sim:Grid: Clone of the grid.
+            :param me:Snake: Searching snake into the clone.
+            :param dead:int: Deaths of the snake when the rollout started.
+        """
+        sim.show_bonus()
+        sim.update_grid(self.single_life)
+        return me.dead == dead
@@ -1,42 +1,219 @@
 # Source code released under gpl v3 licence, see COPYING file
 
-from pyglet import window, clock, image
-from pyglet.gl import *  # pylint: disable=unused-wildcard-import
-from pyglet.window import key
-from random import choice, randint
-from pyglet import font
-from pyglet.font import Text
+from random import Random
+from collections import deque
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import copy
+import argparse
+import time
+import warnings
+
+from cells import EMPTY, WALL, SNAKE, BONUS, KIND, KIND_BITS, AGED, ID_BITS, ID_MASK, ID_DTYPE, MAX_SNAKES, \
+    GOOD_BONUS, MILD_BONUS, snake_cell
+
+# Default layout of the arena, for a 72 x 48 grid.
+# Walls are (bottom_left, top_right) tuples.
+DEFAULT_WALLS = [
+    ((22, 10), (48, 11)),
+    ((22, 36), (48, 37)),
+    ((10, 22), (11, 24)),
+    ((60, 22), (61, 24))
+]
+# Snakes are (type, keys, color) tuples. The keys are only used by human snakes.
+DEFAULT_ROSTER = [
+    ('cpu', (0, 0, 0, 0), 1),
+    ('cpu', (0, 0, 0, 0), 2),
+    ('cpu', (0, 0, 0, 0), 3),
+    ('cpu', (0, 0, 0, 0), 4),
+    ('drone', (0, 0, 0, 0), 8),
+    ('drone', (0, 0, 0, 0), 8)
+]
+# Distances at which CPUs look ahead for obstacles.
+LOOKAHEAD = (2, 4, 4, 8, 8, 8)
 
 # Grid
 class Grid:
 
-    def __init__(self, width: int, height: int, bonus_timeout: int = 74):
+    # Age until which snake cells fade, so change color every tick.
+    fade_age = 121
+
+    # Copying a few hundred cells at once costs about as much as rewriting a single one, so clones are rewound
+    # cell by cell only when they touched fewer cells than the grid holds divided by this.
+    rewind_ratio = 256
+
+    # Bonus drawn each tick, 0 being no bonus.
+    bonus = (0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+             0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, GOOD_BONUS, GOOD_BONUS)
+
+    def __init__(self, width: int, height: int, bonus_timeout: int = 74, seed: int = None):
         self.width = width
         self.height = height
         # 0,0 is bottom left.
-        #(id, age)
-        # id = 0          : empty
-        # id >= 1 e <=20  : snake (human, cpu, drone)
-        # id >=21 e <=40  : bonus
-        # id = 255        : wall
-        self.data = [[(0, 0)]*self.width for i in range(self.height)]
+        # Each cell holds an id and a birth, packed as birth << ID_BITS | id. Ids are encoded as per cells.py:
+        # EMPTY, WALL, a snake (human, cpu, drone...) by its id, or a bonus by its type.
+        # birth is the tick at which the cell was set, its age is tick - birth.
+        self.tick = 0
+        # Flat indices of the cells which changed since the end of the last tick, only tracked while the grid
+        # is observed. At the end of each tick, they are given to every observer, functions called with the set,
+        # and kept into last_dirty.
+        self.dirty = set()
+        self.last_dirty = set()
+        self.observers = []
+        # Flat indices of the cells written since a clone made by scratch was last rewound, None for other grids.
+        self.touched = None
+        # Executor running the decisions of the snakes with a planner concurrently, None to run them one by one.
+        self.pool = None
+        # TickStats timing the phases of the ticks, None when not measured.
+        self.stats = None
+        # Every random decision of the grid and its snakes comes from this generator, so a seed replays a game.
+        self.random = Random(seed)
+        self.init_data()
+        # ahead[distance][dir] holds (xs, ys) tables such that the cell distance cells ahead of (x, y)
+        # in the direction dir is (xs[x], ys[y]), wrapping around the boundaries.
+        self.ahead = {}
+        for distance in (1,) + LOOKAHEAD:
+            if distance not in self.ahead:
+                self.ahead[distance] = self.ahead_tables(distance)
+        # Index of the empty cells: free holds their flat indices (y * width + x) in any order,
+        # free_pos holds the position of each cell into free, or -1 if the cell is not empty.
+        self.free = array('l', range(self.width * self.height))
+        self.free_pos = array('l', range(self.width * self.height))
         self.snakes = []
         self.bonus_timeout = bonus_timeout
-        self.bonus = (0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-                      0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 21, 21)
+        # (x, y, birth) of the bonuses, oldest first.
+        self.bonus_cells = deque()
+        # (x, y, type) of the bonus added during the current tick, if any.
+        self.last_bonus = None
+
+    def init_data(self):
+        """
+        Creates the storage of the cells, all empty: a row of packed cells for each y.
+            :param self: 
+        """
+        self.data = [array('q', bytes(8 * self.width)) for i in range(self.height)]
+
+    def copy_data(self, grid):
+        """
+        Gives a copy of the storage of the cells to a clone of the grid.
+            :param self: 
+            :param grid:Grid: Clone of the grid.
+        """
+        grid.data = [row[:] for row in self.data]
+
+    def copy_cells(self, grid, cells: set):
+        """
+        Gives some cells of the grid back to a clone of the grid, and their place into the index of the empty cells.
+            :param self: 
+            :param grid:Grid: Clone of the grid.
+            :param cells:set: Flat indices of the cells.
+        """
+        for cell in cells:
+            y, x = divmod(cell, self.width)
+            grid.data[y][x] = self.data[y][x]
+            grid.cell_written(x, y, self.free_pos[cell] >= 0)
+
+    def clone(self, rng: Random) -> 'Grid':
+        """
+        Returns a copy of the grid and its snakes, to simulate the game without changing it.
+        The clone has no observer, and draws every random decision of the grid and its snakes from rng.
+            :param self: 
+            :param rng:Random: Random generator of the clone.
+        """
+        grid = copy.copy(self)
+        self.copy_data(grid)
+        grid.observers = []
+        grid.touched = None
+        grid.pool = None
+        grid.stats = None
+        grid.free = self.free[:]
+        grid.free_pos = self.free_pos[:]
+        self.copy_state(grid, rng)
+        return grid
+
+    def copy_state(self, grid, rng: Random):
+        """
+        Gives the tick, the snakes and the bonuses of the grid to a clone of the grid, all but its cells.
+            :param self: 
+            :param grid:Grid: Clone of the grid.
+            :param rng:Random: Random generator of the clone.
+        """
+        grid.tick = self.tick
+        grid.dirty = set()
+        grid.last_dirty = set()
+        grid.random = rng
+        grid.snakes = [snake.clone(rng) for snake in self.snakes]
+        grid.bonus_cells = deque(self.bonus_cells)
+        grid.last_bonus = self.last_bonus
+
+    def scratch(self, rng: Random) -> 'Grid':
+        """
+        Returns a clone of the grid keeping the cells it writes into its touched set, so that rewind
+        brings it back to the state of the grid without copying every cell again.
+            :param self: 
+            :param rng:Random: Random generator of the clone.
+        """
+        grid = self.clone(rng)
+        grid.touched = set()
+        return grid
+
+    def rewind(self, grid, rng: Random):
+        """
+        Brings a clone made by scratch back to the state of the grid, which must not have changed since,
+        only rewriting the cells the clone changed when they are few enough.
+            :param self: 
+            :param grid:Grid: Clone of the grid.
+            :param rng:Random: New random generator of the clone.
+        """
+        touched, grid.touched = grid.touched, None
+        if len(touched) * self.rewind_ratio < self.width * self.height:
+            self.copy_cells(grid, touched)
+        else:
+            self.copy_data(grid)
+            grid.free = self.free[:]
+            grid.free_pos = self.free_pos[:]
+        touched.clear()
+        grid.touched = touched
+        self.copy_state(grid, rng)
+
+    def ahead_tables(self, distance: int) -> tuple:
+        """
+        Returns the (xs, ys) tables of coordinates some cells ahead, for each direction.
+            :param self: 
+            :param distance:int: Number of cells ahead.
+        """
+        same_x = tuple(range(self.width))
+        same_y = tuple(range(self.height))
+        up = tuple((y + distance) % self.height for y in range(self.height))
+        right = tuple((x + distance) % self.width for x in range(self.width))
+        down = tuple((y - distance) % self.height for y in range(self.height))
+        left = tuple((x - distance) % self.width for x in range(self.width))
+        # 0: Up // 1: Right // 2: Down // 3: Left
+        return ((same_x, up), (right, same_y), (same_x, down), (left, same_y))
 
-    def new_snake(self, snakeType: str, keys: tuple, color: int):
+    def new_snake(self, snakeType: str, keys: tuple, color: int, planners: dict = None):
         """
-        Adds a new snake at a random position to the grid.
+        Adds a new snake at a random position to the grid, with its planner if its type chooses its moves with one.
             :param self: 
             :param snakeId:int: ID of the snake.
             :param snakeType:str: Type of the snake.
             :param keys:tuple: Keys to move the snake.
             :param color:int: Color of the snake, as per the "colors" variable.
+            :param planners:dict: Functions building the planners of some types, used instead of those of PLANNERS.
         """   
-        newSnake = Snake(len(self.snakes) + 1, snakeType, keys, color, self.random_point())
+        coord = self.random_point()
+        if coord[0] is None:
+            raise ValueError("No empty cell left for a new snake.")
+        if len(self.snakes) >= MAX_SNAKES:
+            raise ValueError("A grid holds at most %d snakes." % MAX_SNAKES)
+        # Each snake draws from its own stream, seeded from the grid's one.
+        newSnake = Snake(len(self.snakes) + 1, snakeType, keys, color, coord, Random(self.random.getrandbits(64)))
+        build = (planners or {}).get(snakeType, PLANNERS.get(snakeType))
+        if build is not None:
+            newSnake.planner = build(self, newSnake)
         self.snakes.append(newSnake)
-        self.set_point(newSnake.x, newSnake.y, (newSnake.id, 0))
+        self.place_snake(newSnake)
 
     def new_wall(self, bottom_left: tuple, top_right: tuple):
         """
@@ -48,7 +225,7 @@ class Grid:
         for x in range(bottom_left[0], top_right[0] + 1):
             for y in range(bottom_left[1], top_right[1] + 1):
                 try:
-                    self.data[y][x] = (255, 0)
+                    self.set_point(x, y, (WALL, 0))
                 except IndexError:
                     pass
 
@@ -59,7 +236,11 @@ class Grid:
             :param x:int: X coord.
             :param y:int: Y coord.
         """
-        return self.data[y][x]
+        value = self.data[y][x]
+        state = value & ID_MASK
+        if state & AGED:
+            return (state, self.tick - (value >> ID_BITS))
+        return (state, 0)
 
     def set_point(self, x: int, y: int, value: tuple):
         """
@@ -67,9 +248,20 @@ class Grid:
             :param self: 
             :param x:int: X coord.
             :param y:int: Y coord.
-            :param value:tuple: Value to set.
+            :param value:tuple: Value to set, as (id, age).
+        """
+        state, age = value
+        self.data[y][x] = (self.tick - age) << ID_BITS | state
+        self.cell_written(x, y, state == EMPTY)
+
+    def place_snake(self, snake):
         """
-        self.data[y][x] = value
+        Sets the head of a snake into the grid, at its current position.
+            :param self: 
+            :param snake:Snake: Snake to place.
+        """
+        self.set_point(snake.x, snake.y, (snake.cell, 0))
+        snake.body.append((snake.x, snake.y, self.tick))
 
     def reset_point(self, x: int, y: int):
         """
@@ -78,93 +270,183 @@ class Grid:
             :param x:int: X coord.
             :param y:int: Y coord.
         """
-        self.data[y][x] = (0, 0)
+        self.data[y][x] = EMPTY
+        self.cell_written(x, y, True)
+
+    def get_arrays(self) -> tuple:
+        """
+        Returns the ids and the ages of every cell, as two NumPy arrays indexed by [y, x].
+            :param self: 
+        """
+        values = np.array(self.data, dtype=np.int64)
+        ids = (values & ID_MASK).astype(ID_DTYPE)
+        return ids, np.where(ids & AGED, self.tick - (values >> ID_BITS), 0)
+
+    def get_cells(self, cells: np.ndarray) -> tuple:
+        """
+        Returns the ids and the ages of some cells, as two NumPy arrays.
+            :param self: 
+            :param cells:np.ndarray: Flat indices of the cells.
+        """
+        ids = np.empty(len(cells), dtype=ID_DTYPE)
+        ages = np.empty(len(cells), dtype=np.int64)
+        for i, cell in enumerate(cells.tolist()):
+            y, x = divmod(cell, self.width)
+            ids[i], ages[i] = self.get_point(x, y)
+        return ids, ages
+
+    def cell_written(self, x: int, y: int, empty: bool):
+        """
+        Marks a cell as dirty, if the grid is observed, and adds or removes it from the index of the empty cells.
+        Must be called on every write to a cell.
+            :param self: 
+            :param x:int: X coord.
+            :param y:int: Y coord.
+            :param empty:bool: Whether the cell is now empty.
+        """
+        # Coordinates are wrapped the same way negative indexes are by the storage.
+        cell = (y % self.height) * self.width + x % self.width
+        if self.observers:
+            self.dirty.add(cell)
+        if self.touched is not None:
+            self.touched.add(cell)
+        pos = self.free_pos[cell]
+        if empty:
+            if pos < 0:
+                self.free_pos[cell] = len(self.free)
+                self.free.append(cell)
+        elif pos >= 0:
+            # Swaps the last empty cell into the slot of the removed one.
+            last = self.free.pop()
+            if last != cell:
+                self.free[pos] = last
+                self.free_pos[last] = pos
+            self.free_pos[cell] = -1
 
     def random_point(self):
         """
-        Returns a tuple of random coordinates with nothing in it at this position.
+        Returns a tuple of random coordinates with nothing in it at this position, or (None, None) if the grid is full.
+        Every empty cell has the same chance to be picked.
             :param self: 
         """
-        bx = randint(0, self.width - 1)
-        by = randint(0, self.height - 1)
-        for y in range(self.height):
-            by = (by + y) % self.height
-            for x in range(self.width):
-                bx = (bx + x) % self.width
-                if self.data[by][bx] == (0, 0):
-                    return (bx, by)
-        return None, None
+        if not self.free:
+            return None, None
+        by, bx = divmod(self.free[self.random.randrange(len(self.free))], self.width)
+        return (bx, by)
 
     def show_bonus(self):
         """
         Adds (or not) a bonus on the grid.
             :param self: 
         """
-        b = choice(self.bonus)
+        b = self.random.choice(self.bonus)
         if b != 0:
             bx, by = self.random_point()
-            self.set_point(bx, by, (b, 0))
+            if bx is None:
+                return
+            self.place_bonus(bx, by, b)
+
+    def place_bonus(self, x: int, y: int, bonusType: int):
+        """
+        Adds a bonus on the grid. It is kept into last_bonus until the end of the tick.
+            :param self: 
+            :param x:int: X coord.
+            :param y:int: Y coord.
+            :param bonusType:int: Id of the bonus, such as GOOD_BONUS.
+        """
+        self.set_point(x, y, (bonusType, 0))
+        self.bonus_cells.append((x, y, self.tick))
+        self.last_bonus = (x, y, bonusType)
+
+    def update_grid(self, single_life: bool, directions: list = None):
+        """
+        Runs a tick in two phases: every snake chooses its direction from the grid as it was when the tick began,
+        then every snake moves, the collisions are resolved and the cells expired.
+            :param self: 
+            :param single_life:bool: Whether snakes are removed on their first death.
+            :param directions:list: Direction of each snake for this tick, instead of choosing them, as when replaying a game.
+        """
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+            dead = sum(snake.dead for snake in self.snakes)
+
+        playing = [not single_life or not snake.reset or snake.type == "drone" for snake in self.snakes]
+        if directions is None:
+            self.decide([snake for i, snake in enumerate(self.snakes) if playing[i]])
+        else:
+            for i, snake in enumerate(self.snakes):
+                if playing[i]:
+                    snake.new_dir = directions[i]
+
+        if stats is not None:
+            decided = time.perf_counter()
+            stats.time['decide'] += decided - start
+
+        # Snakes which moved this tick and are still on the grid, by the flat cell of their head.
+        heads = {}
 
-    def update_grid(self, single_life: bool, draw_grid : bool = False, colors : list = [], squares_verts : list = []):
-        
         for i in range(len(self.snakes)):
 
-            if not single_life or not self.snakes[i].reset or self.snakes[i].type == "drone":
+            if playing[i]:
 
-                # Choosing new direction for CPUs, and moving snakes into their new position.
+                # Moving snakes into their new position.
                 snake1 = self.snakes[i]
                 snake1.reset = False
-                snake1.select_new_direction(self)
                 snake1.dir = snake1.new_dir
                 snake1.move(self)
 
                 # Checking for head to head collision with previously moved snakes.
-                for j in range(i):
-                    snake2 = self.snakes[j]
-                    if snake1.id != snake2.id:
-                        if snake1.new_x == snake2.new_x and snake1.new_y == snake2.new_y:
-                            snake1.reset = True
-                            snake2.reset = True
-                            snake1.reset_tail()
-                            snake2.reset_tail()
-                            snake1.dead += 1
-                            snake2.dead += 1
-                            if single_life:
-                                if snake2.type != "drone":
-                                    snake2.remove_snake()
-                                if snake1.type != "drone":
-                                    snake1.remove_snake()
-                                    continue
-
-                if snake1.reset:
-                    pass
+                head = snake1.new_y * self.width + snake1.new_x
+                for snake2 in heads.get(head, ()):
+                    if snake2.x < 0:
+                        continue
+                    if stats is not None:
+                        stats.collisions += 1
+                    snake1.reset = True
+                    snake2.reset = True
+                    snake1.reset_tail()
+                    snake2.reset_tail()
+                    snake1.dead += 1
+                    snake2.dead += 1
+                    if single_life:
+                        if snake2.type != "drone":
+                            snake2.remove_snake()
+                        if snake1.type != "drone":
+                            snake1.remove_snake()
 
                 snake1.x = snake1.new_x
                 snake1.y = snake1.new_y
 
                 state, age = self.get_point(snake1.x, snake1.y)
 
-                if state == 0: # If new cell is empty, the grid can easily be updated.
-                    self.set_point(snake1.x, snake1.y, (snake1.id, 0))
+                kind = state & KIND
 
-                elif state >= 1 and state <= 20: # If new cell is already occupied by another snake.
+                if state == EMPTY: # If new cell is empty, the grid can easily be updated.
+                    self.place_snake(snake1)
+
+                elif kind == SNAKE: # If new cell is already occupied by another snake.
                     if snake1.type == "drone":
-                        self.set_point(snake1.x, snake1.y, (snake1.id, 0))
+                        self.place_snake(snake1)
                     else:
+                        if stats is not None:
+                            stats.collisions += 1
                         snake1.reset = True
                         snake1.reset_tail()
                         snake1.dead += 1
-                        if state != snake1.id: # If the snake's tail wasn't ours
-                            self.snakes[state-1].kill += 1
+                        if state != snake1.cell: # If the snake's tail wasn't ours
+                            self.snakes[(state >> KIND_BITS) - 1].kill += 1
                         if single_life:
                             snake1.remove_snake()
                             continue
                 
-                elif state >= 21 and state <= 40: # Bonus
-                    self.set_point(snake1.x, snake1.y, (snake1.id, 0))
+                elif kind == BONUS: # Bonus
+                    self.place_snake(snake1)
                     snake1.edit_tail(state, True)
 
-                elif state == 255: # Wall
+                elif state == WALL: # Wall
+                    if stats is not None:
+                        stats.collisions += 1
                     snake1.reset = True
                     snake1.reset_tail()
                     snake1.dead += 1
@@ -172,93 +454,241 @@ class Grid:
                         snake1.remove_snake()
                         continue
 
-        if draw_grid:
-            verts_coord = []
-            verts_color = []
+                heads.setdefault(head, []).append(snake1)
 
-        for y in range(self.height):
-            for x in range(self.width):
-                state, age = self.get_point(x, y)
+        if stats is not None:
+            moved = time.perf_counter()
+            stats.time['move'] += moved - decided
+            stats.resets += sum(snake.dead for snake in self.snakes) - dead
 
-                if draw_grid:
-                    color_index = 0
-                    fade = 1
+        self.expire_cells()
+
+        self.last_dirty = self.dirty
+        self.dirty = set()
+        for observer in self.observers:
+            observer(self.last_dirty)
+        self.last_bonus = None
+
+        if stats is not None:
+            stats.time['expire'] += time.perf_counter() - moved
+            stats.ticks += 1
+
+    def decide(self, snakes: list):
+        """
+        Chooses the new direction of some snakes, none of them having moved yet.
+        Each snake only reads the grid and draws from its own generator, so snakes with a planner
+        are run concurrently on the decision pool, if any, and the others right away.
+            :param self: 
+            :param snakes:list: Snakes playing this tick.
+        """
+        if self.pool is None:
+            for snake in snakes:
+                snake.select_new_direction(self)
+            return
+        pending = [self.pool.submit(snake.select_new_direction, self) for snake in snakes if snake.planner is not None]
+        for snake in snakes:
+            if snake.planner is None:
+                snake.select_new_direction(self)
+        for future in pending:
+            future.result()
+
+    def expire_cells(self):
+        """
+        Clears the snake and bonus cells which expired, and ages all the others by one.
+        A snake cell expires when it is older than the tail of its snake or when its snake was reset.
+        A bonus cell expires when it is older than the bonus timeout.
+        Only the ends of the bodies and the oldest bonuses are looked at, not the whole grid.
+        When the grid is observed, the snake cells still fading are marked dirty, as their age changes their color.
+            :param self: 
+        """
+        observed = len(self.observers) > 0
+        bonus_cells = self.bonus_cells
+        # Cells scanned are the expired ones, counted from the lengths of the bodies, and the fading ones.
+        scanned = 0
+        if self.stats is not None:
+            scanned = sum(len(snake.body) for snake in self.snakes) + len(bonus_cells)
+
+        for snake in self.snakes:
+            body = snake.body
+            if snake.reset:
+                while body:
+                    self.clear_cell(snake.cell, *body.popleft())
+            else:
+                while body and self.tick - body[0][2] > snake.tail:
+                    self.clear_cell(snake.cell, *body.popleft())
+                if observed:
+                    for x, y, birth in reversed(body):
+                        if self.tick - birth >= self.fade_age:
+                            break
+                        self.dirty.add(y * self.width + x)
+                        scanned += 1
+
+        while bonus_cells and self.tick - bonus_cells[0][2] > self.bonus_timeout:
+            x, y, birth = bonus_cells.popleft()
+            state, age = self.get_point(x, y)
+            if state & KIND == BONUS:
+                self.clear_cell(state, x, y, birth)
+
+        if self.stats is not None:
+            self.stats.cells_scanned += scanned - sum(len(snake.body) for snake in self.snakes) - len(bonus_cells)
+        self.tick += 1
+
+    def clear_cell(self, state: int, x: int, y: int, birth: int):
+        """
+        Resets a cell only if it still holds what was set at the given tick.
+        Cells may have been overwritten since, by a drone or a snake eating a bonus.
+            :param self: 
+            :param state:int: Id the cell was set with.
+            :param x:int: X coord.
+            :param y:int: Y coord.
+            :param birth:int: Tick at which the cell was set.
+        """
+        if self.get_point(x, y) == (state, self.tick - birth):
+            self.reset_point(x, y)
+
+
+class ArrayGrid(Grid):
+    """
+    Grid storing its cells into two NumPy arrays instead of rows of packed cells.
+    The ids and the births are stored separately, indexed by [y, x].
+    It behaves exactly like the Grid.
+    """
+
+    def init_data(self):
+        """
+        Creates the arrays of ids and births, all empty.
+            :param self: 
+        """
+        self.ids = np.zeros((self.height, self.width), dtype=ID_DTYPE)
+        self.births = np.zeros((self.height, self.width), dtype=np.int64)
+
+    def copy_data(self, grid):
+        """
+        Gives a copy of the arrays of the cells to a clone of the grid.
+            :param self: 
+            :param grid:Grid: Clone of the grid.
+        """
+        grid.ids = self.ids.copy()
+        grid.births = self.births.copy()
+
+    def copy_cells(self, grid, cells: set):
+        """
+        Gives some cells of the grid back to a clone of the grid, and their place into the index of the empty cells.
+            :param self: 
+            :param grid:Grid: Clone of the grid.
+            :param cells:set: Flat indices of the cells.
+        """
+        flat = np.fromiter(cells, dtype=np.int64, count=len(cells))
+        grid.ids.reshape(-1)[flat] = self.ids.reshape(-1)[flat]
+        grid.births.reshape(-1)[flat] = self.births.reshape(-1)[flat]
+        for cell in cells:
+            y, x = divmod(cell, self.width)
+            grid.cell_written(x, y, self.free_pos[cell] >= 0)
+
+    def get_point(self, x: int, y: int) -> tuple:
+        """
+        Get the value associated to a coordinate into the grid.
+            :param self: 
+            :param x:int: X coord.
+            :param y:int: Y coord.
+        """
+        state = int(self.ids[y, x])
+        if state & AGED:
+            return (state, self.tick - int(self.births[y, x]))
+        return (state, 0)
+
+    def set_point(self, x: int, y: int, value: tuple):
+        """
+        Set a value to a coordinate into the grid.
+            :param self: 
+            :param x:int: X coord.
+            :param y:int: Y coord.
+            :param value:tuple: Value to set, as (id, age).
+        """
+        state, age = value
+        self.ids[y, x] = state
+        self.births[y, x] = self.tick - age
+        self.cell_written(x, y, state == EMPTY)
+
+    def reset_point(self, x: int, y: int):
+        """
+        Reset the value associated to the coordinates.
+            :param self: 
+            :param x:int: X coord.
+            :param y:int: Y coord.
+        """
+        self.ids[y, x] = 0
+        self.births[y, x] = 0
+        self.cell_written(x, y, True)
+
+    def get_arrays(self) -> tuple:
+        """
+        Returns the ids and the ages of every cell, as two NumPy arrays indexed by [y, x].
+        The ids are the grid's own array, which must not be modified.
+            :param self: 
+        """
+        return self.ids, np.where(self.ids & AGED, self.tick - self.births, 0)
+
+    def get_cells(self, cells: np.ndarray) -> tuple:
+        """
+        Returns the ids and the ages of some cells, as two NumPy arrays.
+            :param self: 
+            :param cells:np.ndarray: Flat indices of the cells.
+        """
+        ids = self.ids.reshape(-1)[cells]
+        births = self.births.reshape(-1)[cells]
+        return ids, np.where(ids & AGED, self.tick - births, 0)
 
-                if state >= 1 and state <= 20:  # Snake
-                    snake = self.snakes[state - 1]
-                    if snake.reset or age > snake.tail:
-                        self.reset_point(x, y)
-                    else:
-                        self.set_point(x, y, (state, age + 1))
-                        if draw_grid:
-                            color_index = snake.color
-                            fade -= 0.005 * age
-                            if fade < 0.4:
-                                fade = 0.4
-
-                elif state >= 21 and state <= 40:  # Bonus
-                    if age > self.bonus_timeout:
-                        self.reset_point(x, y)
-                    else:
-                        self.set_point(x, y, (state, age + 1))
-                        if draw_grid:
-                            if state == 21:  # Good bonus
-                                color_index = 11
-                            else:  # Mild bonus
-                                color_index = 12
-
-                elif state == 255:  # Wall
-                    if draw_grid:
-                        color_index = 10
-
-                if draw_grid:
-                    if color_index > 0:
-                        r, g, b = colors[color_index]
-                        verts_color.extend([r*fade, g*fade, b*fade]*4)
-                        verts_coord.extend(squares_verts[y][x])
-
-        if draw_grid:
-            verts_coord_size = len(verts_coord)
-            verts_color_size = len(verts_color)
-            verts_coord_gl = (GLfloat * verts_coord_size)(*verts_coord)
-            verts_color_gl = (GLfloat * verts_color_size)(*verts_color)
-            glEnableClientState(GL_VERTEX_ARRAY)
-            glEnableClientState(GL_COLOR_ARRAY)
-            glColorPointer(3, GL_FLOAT, 0, verts_color_gl)
-            glVertexPointer(2, GL_FLOAT, 0, verts_coord_gl)
-            glDrawArrays(GL_QUADS, 0, verts_coord_size // 2)
-            glDisableClientState(GL_VERTEX_ARRAY)
-            glDisableClientState(GL_COLOR_ARRAY)
 
 class Snake:
-    def __init__(self, snakeId: int, snakeType: str, keys: tuple, color: int, coord: tuple):
+
+    # Directions drawn by CPUs and drones, for each current direction.
+    cpu_ai = [
+        (0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 3),
+        (1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+         1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 2, 2, 0),
+        (2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
+         2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 3, 3, 1),
+        (3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3,
+         3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 0, 0, 2)
+    ]
+
+    # Directions drawn by CPUs to avoid an obstacle, for each current direction.
+    cpu_avoid = [
+        (1, 1, 1, 3),
+        (2, 2, 2, 0),
+        (3, 3, 3, 1),
+        (0, 0, 0, 2)
+    ]
+
+    def __init__(self, snakeId: int, snakeType: str, keys: tuple, color: int, coord: tuple, rng: Random = None):
         """
         Initializes a snake.
             :param self: 
             :param snakeId:int: ID of the snake. Must be unique (I guess).
-            :param snakeType:str: Type of the snake. Either "drone", "human" or "cpu".
+            :param snakeType:str: Type of the snake. Either "drone", "human", "cpu", "mcts", "flood" or "qcpu".
             :param keys:tuple: Tuple of four Pyglet keys associated to the movements of the snake.
             :param color:int: Index of a colour from the "colors" variable defined in the body of the code.
             :param coord:tuple: Coordinates of the head in the grid.
+            :param rng:Random: Random generator of the snake, a new unseeded one if None.
         """
         self.id = snakeId
+        # Id of the cells of the snake.
+        self.cell = snake_cell(snakeId)
+        self.random = rng if rng is not None else Random()
         self.type = snakeType
 
-        if snakeType == 'drone':
-            self.min_tail = 0
-            self.max_tail = 0
-            self.default_tail = 0
-        else:
-            self.min_tail = 9
-            self.max_tail = 299
-            self.default_tail = 29
+        self.min_tail, self.max_tail, self.default_tail = Snake.tail_limits(snakeType)
 
         self.reset_tail()
+        # (x, y, birth) of the cells of the snake, oldest first.
+        self.body = deque()
         self.x, self.y = coord
         self.new_x = self.x
         self.new_y = self.y
         # 0: Up // 1: Right // 2: Down // 3: Left
-        self.dir = choice((0, 1, 2, 3))
+        self.dir = self.random.choice((0, 1, 2, 3))
         self.new_dir = self.dir
         self.score = 0
         self.reset = False
@@ -266,24 +696,33 @@ class Snake:
         self.color = color
         self.dead = 0
         self.kill = 0
+        # Chooses the moves of the snake instead of the rules of its type, given by Grid.new_snake (see PLANNERS).
+        self.planner = None
 
-        self.cpu_ai = [
-            (0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-             0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 3),
-            (1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
-             1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 2, 2, 0),
-            (2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2,
-             2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 3, 3, 1),
-            (3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3,
-             3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 0, 0, 2)
-        ]
-
-        self.cpu_avoid = [
-            (1, 1, 1, 3),
-            (2, 2, 2, 0),
-            (3, 3, 3, 1),
-            (0, 0, 0, 2)
-        ]
+    def clone(self, rng: Random) -> 'Snake':
+        """
+        Returns a copy of the snake, for a clone of the grid.
+        Snakes searching their moves play as CPUs into clones.
+            :param self: 
+            :param rng:Random: Random generator of the clone.
+        """
+        snake = copy.copy(self)
+        snake.body = deque(self.body)
+        snake.random = rng
+        if self.planner is not None:
+            snake.type = 'cpu'
+            snake.planner = None
+        return snake
+
+    @staticmethod
+    def tail_limits(snakeType: str) -> tuple:
+        """
+        Returns the minimum, maximum and default lengths of the tail of a type of snake.
+            :param snakeType:str: Type of the snake.
+        """
+        if snakeType == 'drone':
+            return (0, 0, 0)
+        return (9, 299, 29)
 
     def remove_snake(self):
             self.tail = 0
@@ -302,17 +741,17 @@ class Snake:
         """
         Edits the length of the tail based on the bonus eaten.
             :param self: 
-            :param bonusType:int: Bonus type. May be 21 or 22.
+            :param bonusType:int: Id of the bonus. May be GOOD_BONUS or MILD_BONUS.
             :param editScore:bool: Whether to edit the snake's score according to the bonus.
         """   
-        if bonusType == 21:
+        if bonusType == GOOD_BONUS:
             if editScore:
                 self.score += 1
             if self.tail != self.max_tail:
                 self.tail += 10
                 if self.tail > self.max_tail:
                     self.tail = self.max_tail
-        elif bonusType == 22:
+        elif bonusType == MILD_BONUS:
             if editScore:
                 self.score += 2
             if self.tail != self.min_tail:
@@ -324,78 +763,130 @@ class Snake:
         """
         Chooses a new direction for a CPU snake.
         It looks a few cells ahead, for the presence of a player, a wall or a bonus.
-        It then changes its direction based on a probability.
+        It then changes its direction based on a probability. MCTS, flood and qcpu snakes choose it with their planner instead.
             :param self: 
             :param grid:Grid: Grid object to reference to when choosing the direction.
         """
         if self.type == 'drone':
-            self.new_dir = choice(self.cpu_ai[self.dir])
+            self.new_dir = self.random.choice(self.cpu_ai[self.dir])
         elif self.type == 'cpu':
-            avoid_detection = choice((2, 4, 4, 8, 8, 8))
-            avoid_x = self.x
-            avoid_y = self.y
-
-            if self.dir == 0:
-                avoid_y += avoid_detection
-            elif self.dir == 1:
-                avoid_x += avoid_detection
-            elif self.dir == 2:
-                avoid_y -= avoid_detection
-            elif self.dir == 3:
-                avoid_x -= avoid_detection
-
-            if avoid_y > grid.height - 1:
-                avoid_y -= grid.height
-            if avoid_x > grid.width - 1:
-                avoid_x -= grid.width
-            if avoid_y < 0:
-                avoid_y += grid.height
-            if avoid_x < 0:
-                avoid_x += grid.width
+            avoid_detection = self.random.choice(LOOKAHEAD)
+            xs, ys = grid.ahead[avoid_detection][self.dir]
 
             state, age = grid.get_point( # pylint: disable=unused-variable
-                avoid_x, avoid_y)
-
-            if state == 0:
-                self.new_dir = choice(self.cpu_ai[self.dir])
-            elif state >= 1 and state <= 20:
-                self.new_dir = choice(self.cpu_avoid[self.dir])
-            elif state >= 21 and state <= 40:
+                xs[self.x], ys[self.y])
+
+            kind = state & KIND
+            if state == EMPTY:
+                self.new_dir = self.random.choice(self.cpu_ai[self.dir])
+            elif kind == SNAKE:
+                self.new_dir = self.random.choice(self.cpu_avoid[self.dir])
+            elif kind == BONUS:
                 self.new_dir = self.dir
-            elif state == 255:
-                self.new_dir = choice(self.cpu_avoid[self.dir])
+            elif state == WALL:
+                self.new_dir = self.random.choice(self.cpu_avoid[self.dir])
+        elif self.planner is not None:
+            self.new_dir = self.planner.search(grid, self)
 
     def move(self, grid: Grid):
         """
-        Moves the snake into its new position and checks if it is outside the boundaries.
+        Moves the snake into its new position, wrapping around the boundaries.
             :param self: 
             :param grid:Grid: Grid to reference against.
         """
-        if self.dir == 0:
-            if self.y < grid.height - 1:
-                self.new_y += 1
-            else:
-                self.new_y = 0
-        elif self.dir == 1:
-            if self.x < grid.width - 1:
-                self.new_x += 1
-            else:
-                self.new_x = 0
-        elif self.dir == 2:
-            if self.y > 0:
-                self.new_y -= 1
-            else:
-                self.new_y = grid.height - 1
-        elif self.dir == 3:
-            if self.x > 0:
-                self.new_x -= 1
-            else:
-                self.new_x = grid.width - 1
+        xs, ys = grid.ahead[1][self.dir]
+        self.new_x = xs[self.new_x]
+        self.new_y = ys[self.new_y]
+
+
+def mcts_planner(grid: Grid, snake: Snake):
+    """
+    Returns the planner of an MCTS snake, searching its moves on clones of the grid.
+        :param grid:Grid: Grid of the snake.
+        :param snake:Snake: New snake.
+    """
+    from mcts import TreeSearch
+    return TreeSearch(snake.random)
+
+
+def flood_planner(grid: Grid, snake: Snake):
+    """
+    Returns the planner of a flood snake, choosing its moves by the space it would own within 24 ticks.
+    The flood snakes of a grid share the floods of the heads, computed once per tick.
+        :param grid:Grid: Grid of the snake.
+        :param snake:Snake: New snake.
+    """
+    from space import VoronoiFill
+    for other in grid.snakes:
+        if isinstance(other.planner, VoronoiFill):
+            return VoronoiFill(other.planner.territory)
+    return VoronoiFill()
+
+
+def qcpu_planner(grid: Grid, snake: Snake):
+    """
+    Returns the planner of a qcpu snake, looking its moves up into the Q table trained by qlearn.py.
+    Without that table, the snake plays as a CPU and None is returned.
+        :param grid:Grid: Grid of the snake.
+        :param snake:Snake: New snake.
+    """
+    from qlearn import DEFAULT_PATH, QLearner, QTable
+    table = QTable.load()
+    if table is None:
+        warnings.warn("No Q table at %s, qcpu snakes play as CPUs. Train one with qlearn.py." % DEFAULT_PATH)
+        snake.type = 'cpu'
+        return None
+    return QLearner(table)
+
+
+# Functions building the planner of each type of snake choosing its moves with one, called with the grid and the new snake.
+# The AI modules are only imported by the games using them.
+PLANNERS = {'mcts': mcts_planner, 'flood': flood_planner, 'qcpu': qcpu_planner}
+
+
+# TickStats
+class TickStats:
+
+    # Phases of a tick, then the drawing of a frame.
+    phases = ('bonus', 'decide', 'move', 'expire', 'render')
+
+    def __init__(self):
+        """
+        Time spent into each phase of the ticks and counters of what happened, since the stats were created or reset.
+        The expire phase includes the observers of the grid, the render phase is timed per frame.
+            :param self: 
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every time and counter back to zero.
+            :param self: 
+        """
+        self.time = dict.fromkeys(self.phases, 0.0)
+        self.ticks = 0
+        self.frames = 0
+        self.collisions = 0
+        self.resets = 0
+        self.cells_scanned = 0
+
+    def summary(self) -> str:
+        """
+        Returns the average time of each phase in milliseconds and the counters per tick, as one line of text.
+            :param self: 
+        """
+        ticks = max(self.ticks, 1)
+        times = ["%s %.3f" % (phase, 1000 * self.time[phase] / ticks) for phase in self.phases[:-1]]
+        times.append("render %.3f" % (1000 * self.time['render'] / max(self.frames, 1)))
+        return "%s ms, collisions %.2f, resets %.2f, cells %.1f per tick" % (
+            ", ".join(times), self.collisions / ticks, self.resets / ticks, self.cells_scanned / ticks)
 
 
 class Game:
 
-    def __init__(self, arena_width: int, arena_height: int, arena_border: int, square_size: int, draw: bool, fps_limit: int = 12, single_life: bool = False):
+    def __init__(self, arena_width: int, arena_height: int, arena_border: int, square_size: int, draw: bool, fps_limit: int = 12, single_life: bool = False, array_grid: bool = False, seed: int = None,
+                 tick_rate: float = None, ticks_per_frame: int = None, decision_workers: int = None, stats: bool = False,
+                 progress: bool = False):
         
         self.single_life = single_life
         
@@ -413,82 +904,56 @@ class Game:
             raise ValueError("Square size too big or arena size too small.")
 
         self.iteration = 0
+        # Whether the tick count is printed now and then.
+        self.progress = progress
 
         self.draw = draw
         self.fps = fps_limit
+        # The window runs the game at tick_rate ticks per second whatever its frame rate,
+        # or at a fixed number of ticks per frame if ticks_per_frame is set.
+        self.tick_rate = tick_rate if tick_rate is not None else fps_limit
+        self.ticks_per_frame = ticks_per_frame
+        # Ticks late by more than this are dropped instead of being caught up, when the game cannot keep up.
+        self.max_ticks_per_frame = max(1, int(self.tick_rate / 4))
+
+        # Pyglet is only imported when the game is drawn.
+        self.renderer = None
+        self.win = None
+        if draw:
+            from render import Renderer
+            self.renderer = Renderer(self)
+            self.win = self.renderer.win
+            self.win.push_handlers(self.on_key_press)
 
-        self.win = window.Window(width = self.screen_width, height = self.screen_height, visible=False)
-        self.colors = []
-        self.squares_verts = []
+        if array_grid:
+            self.grid = ArrayGrid(self.grid_width, self.grid_height, seed = seed)
+        else:
+            self.grid = Grid(self.grid_width, self.grid_height, seed = seed)
         if draw:
-            self.header_img = image.load("header.png").texture
-            clock.set_fps_limit(self.fps)
-            self.font = font.load("Arial", 12, bold = True, italic = False)
-            self.arena_verts = [
-                (self.arena_border-1, self.arena_border-2),
-                (self.arena_border+self.arena_width+1, self.arena_border-2),
-                (self.arena_border+self.arena_width+1, self.arena_border+self.arena_height),
-                (self.arena_border-1, self.arena_border+self.arena_height),
-                (self.arena_border-1, self.arena_border-2)
-            ]
-            self.points_coord = [
-                (150, self.screen_height - 20),
-                (150, self.screen_height - 40),
-                (420, self.screen_height - 20),
-                (420, self.screen_height - 40)
-            ]
-            self.colors = [
-                (0, 0, 0),
-                (0, 0, 1),
-                (1, 1, 0),
-                (1, 0, 1),
-                (0, 1, 1),
-                (0.5, 0.5, 0),
-                (0.5, 0, 0.5),
-                (0, 0.5, 0.5),
-                (1, 1, 1),
-                (1, 1, 1),
-                (1, 1, 1),
-                (0, 1, 0),
-                (1, 0, 0)
-            ]
-            self.square_verts = [
-                (0, 0),
-                (self.square_size-1, 0),
-                (self.square_size-1, self.square_size-1),
-                (0, self.square_size-1)
-            ]
-            for y in range(self.grid_height):
-                self.squares_verts.append([])
-                for x in range(self.grid_width):
-                    self.squares_verts[y].append([])
-                    for vx, vy in self.square_verts:
-                        self.squares_verts[y][x].append(vx + self.arena_border + (x * self.square_size))
-                        self.squares_verts[y][x].append(vy + self.arena_border + (y * self.square_size))
-
-        self.grid = Grid(self.grid_width, self.grid_height)
-
-    def draw_header(self):
-        glColor3f(1, 1, 1)
-        self.header_img.blit(self.arena_border, self.arena_border + self.arena_border + self.arena_height)
-
-    def draw_points(self):
-        for snake in self.grid.snakes:
-            if snake.type != 'drone':
-                text = "KILL %-3d, DEATH %-3d, BONUS %-3d" % (
-                    snake.kill, snake.dead, snake.score)
-                x, y = self.points_coord[snake.id - 1]
-                r, g, b = self.colors[snake.color]
-                txt = Text(self.font, text, x, y, color=(r, g, b, 1))
-                txt.draw()
-
-    def draw_arena(self):
-        glBegin(GL_LINES)
-        glColor3f(0.5, 0.5, 0.5)
-        for i in range(4):
-            glVertex2f(*(self.arena_verts[i]))
-            glVertex2f(*(self.arena_verts[i + 1]))
-        glEnd()
+            self.grid.observers.append(self.renderer.cells_changed)
+        # Timing of the phases of the ticks, only measured when asked for.
+        self.stats = TickStats() if stats else None
+        self.grid.stats = self.stats
+        # Snakes with a planner choose their directions concurrently, on a pool of threads.
+        # Games stay identical to serial ones only when MCTS snakes search a fixed number of rollouts:
+        # with a time budget, the rollouts run depend on the timing of the threads.
+        if decision_workers:
+            self.grid.pool = ThreadPoolExecutor(decision_workers)
+
+    def __enter__(self) -> 'Game':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stops the threads choosing the decisions of the snakes, if any. Games used as context managers are closed on exit.
+            :param self: 
+        """
+        if self.grid.pool is not None:
+            self.grid.pool.shutdown()
+            self.grid.pool = None
 
     def run(self):
         if self.draw:
@@ -497,64 +962,162 @@ class Game:
             self.run_headless()
 
     def run_window(self):
+        """
+        Runs the game into its window. The game ticks on a fixed timestep independent of the frame rate:
+        as many ticks as due are run before each frame, which only draws the latest state.
+            :param self: 
+        """
         self.win.set_visible()
+        last = time.perf_counter()
+        due = 0.0
         while not self.win.has_exit:
-            self.win.dispatch_events()
-            clock.tick()
-            self.win.set_caption('Pytron v0.5 (fps: %s)' % (round(clock.get_fps())))
-
-            glClear(GL_COLOR_BUFFER_BIT)
-            glLoadIdentity()
-
-            self.draw_header()
-            self.draw_arena()
-
-            self.run_once(True)
-
-            self.draw_points()
-            self.win.flip()
+            self.renderer.begin_frame(self.stats)
+            if self.ticks_per_frame is not None:
+                ticks = self.ticks_per_frame
+            else:
+                now = time.perf_counter()
+                due += (now - last) * self.tick_rate
+                last = now
+                ticks = min(int(due), self.max_ticks_per_frame)
+                # Only the ticks beyond the cap are dropped, the fraction of the next one is kept.
+                due = min(due - ticks, self.max_ticks_per_frame)
+            for i in range(ticks):
+                self.run_once()
+            if self.stats is not None:
+                start = time.perf_counter()
+                self.renderer.end_frame(self.grid)
+                self.stats.time['render'] += time.perf_counter() - start
+                self.stats.frames += 1
+            else:
+                self.renderer.end_frame(self.grid)
 
-    def run_headless(self):
-        while not self.win.has_exit:
-            self.run_once(False)
+    def run_headless(self, ticks: int = None, stop = None):
+        """
+        Runs the game without drawing it, until the tick budget is spent or the stop condition is met.
+            :param self: 
+            :param ticks:int: Number of ticks to run, None to run without limit.
+            :param stop:function: Called with the game after each tick, the run ends when it returns True.
+        """
+        end = None if ticks is None else self.iteration + ticks
+        while end is None or self.iteration < end:
+            self.run_once()
+            if stop is not None and stop(self):
+                break
 
-    def run_once(self, display: bool):
-        self.grid.show_bonus()
-        self.grid.update_grid(self.single_life, display, self.colors, self.squares_verts)
+    def on_key_press(self, symbol, modifiers):
+        for snake in self.grid.snakes:
+            if snake.type == 'human':
+                if symbol == snake.up and snake.dir != 2:
+                    snake.new_dir = 0
+                elif symbol == snake.right and snake.dir != 3:
+                    snake.new_dir = 1
+                elif symbol == snake.down and snake.dir != 0:
+                    snake.new_dir = 2
+                elif symbol == snake.left and snake.dir != 1:
+                    snake.new_dir = 3
+
+    def run_once(self):
+        if self.stats is not None:
+            start = time.perf_counter()
+            self.grid.show_bonus()
+            self.stats.time['bonus'] += time.perf_counter() - start
+        else:
+            self.grid.show_bonus()
+        self.grid.update_grid(self.single_life)
         self.iteration += 1
-        if self.iteration % 1024 == 0:
+        if self.progress and self.iteration % 1024 == 0:
+            planners = [snake.planner for snake in self.grid.snakes if snake.type == 'mcts']
+            if planners:
+                print("%d (mcts: %d rollouts/s)" % (self.iteration, sum(p.rollouts_per_second() for p in planners) / len(planners)))
+            else:
                 print(self.iteration)
 
 
-game = Game(720, 480, 10, 10, True, 12, False)
 
-
-@game.win.event
-def on_key_press(symbol, modifiers):
+def make_game(arena_width: int = 720, arena_height: int = 480, arena_border: int = 10, square_size: int = 10, draw: bool = False,
+              fps_limit: int = 12, single_life: bool = False, array_grid: bool = False, walls: list = DEFAULT_WALLS,
+              roster: list = DEFAULT_ROSTER, seed: int = None, tick_rate: float = None, ticks_per_frame: int = None,
+              decision_workers: int = None, stats: bool = False, progress: bool = False, planners: dict = None) -> Game:
+    """
+    Builds a game ready to be run, with its walls and snakes.
+        :param arena_width:int: Width of the arena in pixels.
+        :param arena_height:int: Height of the arena in pixels.
+        :param arena_border:int: Border around the arena in pixels.
+        :param square_size:int: Size of a cell in pixels.
+        :param draw:bool: Whether the game is drawn into a window.
+        :param fps_limit:int: Frame rate of the window.
+        :param single_life:bool: Whether snakes are removed on their first death.
+        :param array_grid:bool: Whether the grid is stored into NumPy arrays.
+        :param walls:list: Walls, as (bottom_left, top_right) tuples given to Grid.new_wall.
+        :param roster:list: Snakes, as (type, keys, color) tuples given to Grid.new_snake.
+        :param seed:int: Seed of the game, None for an unseeded one.
+        :param tick_rate:float: Ticks per second of the window, the frame rate by default.
+        :param ticks_per_frame:int: Fixed number of ticks per frame of the window, instead of tick_rate.
+        :param decision_workers:int: Number of threads choosing the directions of the snakes with a planner, None for none.
+            The game must then be closed. Results only match a serial game when MCTS snakes are bounded by max_rollouts.
+        :param stats:bool: Whether the phases of the ticks are timed into game.stats.
+        :param progress:bool: Whether the tick count, and the speed of the MCTS snakes, are printed every 1024 ticks.
+        :param planners:dict: Functions building the planners of some snake types, called with the grid and the snake,
+            used instead of those of PLANNERS.
+    """
+    game = Game(arena_width, arena_height, arena_border, square_size, draw, fps_limit, single_life, array_grid, seed,
+                tick_rate, ticks_per_frame, decision_workers, stats, progress)
+    for bottom_left, top_right in walls:
+        game.grid.new_wall(bottom_left, top_right)
+    for snakeType, keys, color in roster:
+        game.grid.new_snake(snakeType, keys, color, planners)
     for snake in game.grid.snakes:
-        if snake.type == 'human':
-            if symbol == snake.up and snake.dir != 2:
-                snake.new_dir = 0
-            elif symbol == snake.right and snake.dir != 3:
-                snake.new_dir = 1
-            elif symbol == snake.down and snake.dir != 0:
-                snake.new_dir = 2
-            elif symbol == snake.left and snake.dir != 1:
-                snake.new_dir = 3
-
-# set wall
-for y in [10, 11, 48 - 12, 49 - 12]:
-    for x in range(22, 67 - 18):
-        game.grid.new_wall((x,y), (x,y))
-for x in [10, 11, 78 - 18, 79 - 18]:
-    for y in range(22, 37 - 12):
-        game.grid.new_wall((x,y), (x,y))
-
-game.grid.new_snake('human', (key.UP, key.RIGHT, key.DOWN, key.LEFT), 1)
-game.grid.new_snake('cpu', (key.W, key.D, key.S, key.A), 2)
-game.grid.new_snake('cpu', (key.R, key.G, key.F, key.D), 3)
-game.grid.new_snake('cpu', (key.U, key.K, key.J, key.H), 4)
-game.grid.new_snake('drone', (0, 0, 0, 0), 8)
-game.grid.new_snake('drone', (0, 0, 0, 0), 8)
-
-game.run()
+        if snake.type == 'mcts':
+            snake.planner.single_life = single_life
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tron like game with artificial intelligence.")
+    parser.add_argument("--headless", action="store_true", help="run the game without window")
+    parser.add_argument("--ticks", type=int, default=None, help="number of ticks to run headless, unlimited by default")
+    parser.add_argument("--single-life", action="store_true", help="remove snakes on their first death")
+    parser.add_argument("--array-grid", action="store_true", help="store the grid into NumPy arrays")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the game")
+    parser.add_argument("--fps", type=int, default=12, help="frame rate of the window")
+    parser.add_argument("--tick-rate", type=float, default=None, help="ticks per second of the window, the frame rate by default")
+    parser.add_argument("--ticks-per-frame", type=int, default=None, help="fixed number of ticks per frame of the window")
+    parser.add_argument("--decision-workers", type=int, default=None, help="threads choosing the moves of mcts and flood snakes")
+    parser.add_argument("--stats", action="store_true", help="time the phases of the ticks, shown in the caption or at the end")
+    parser.add_argument("--record", default=None, help="record the game into this replay file, read by replay.py")
+    args = parser.parse_args()
+
+    roster = DEFAULT_ROSTER
+    if not args.headless:
+        from pyglet.window import key
+        roster = [
+            ('human', (key.UP, key.RIGHT, key.DOWN, key.LEFT), 1),
+            ('cpu', (key.W, key.D, key.S, key.A), 2),
+            ('cpu', (key.R, key.G, key.F, key.D), 3),
+            ('cpu', (key.U, key.K, key.J, key.H), 4),
+            ('drone', (0, 0, 0, 0), 8),
+            ('drone', (0, 0, 0, 0), 8)
+        ]
+
+    game = make_game(draw = not args.headless, fps_limit = args.fps, single_life = args.single_life, array_grid = args.array_grid,
+                     roster = roster, seed = args.seed, tick_rate = args.tick_rate, ticks_per_frame = args.ticks_per_frame,
+                     decision_workers = args.decision_workers, stats = args.stats, progress = True)
+    recorder = None
+    if args.record:
+        from replay import Recorder
+        recorder = Recorder(game.grid, args.record, args.single_life)
+    try:
+        if args.headless:
+            game.run_headless(args.ticks)
+        else:
+            game.run()
+    finally:
+        if recorder:
+            recorder.close()
+        game.close()
+        if game.stats is not None:
+            print(game.stats.summary())
+
+
+if __name__ == "__main__":
+    main()
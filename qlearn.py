@@ -0,0 +1,213 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import argparse
+import os
+import numpy as np
+
+from cells import WALL, SNAKE, BONUS, KIND
+
+# Obstacle distances are bucketed into 1, 2, 3-4, 5-8 and farther, looking at most LOOK cells ahead.
+LOOK = 8
+DISTANCE_BUCKET = (0, 0, 1, 2, 2, 3, 3, 3, 3, 4)
+# State: bucketed distance straight ahead, on the right and on the left, then the side of the nearest
+# bonus (none, ahead, right, behind, left).
+STATES = 5 * 5 * 5 * 5
+# Actions are relative to the direction of the snake: straight, right, left.
+ACTIONS = 3
+TURNS = (0, 1, 3)
+# Default table of the 'qcpu' snakes, next to this file.
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qtable.npy')
+
+
+def encode(grid, snake) -> int:
+    """
+    Returns the state of a snake: how far the obstacles are in the three directions it may take,
+    and on which side the nearest bonus is, all relative to its direction.
+        :param grid:Grid: Grid of the game.
+        :param snake:Snake: Snake to encode.
+    """
+    state = 0
+    for turn in TURNS:
+        xs, ys = grid.ahead[1][(snake.dir + turn) % 4]
+        x, y = snake.x, snake.y
+        distance = LOOK + 1
+        for step in range(1, LOOK + 1):
+            x, y = xs[x], ys[y]
+            cell = grid.get_point(x, y)[0]
+            if cell & KIND == SNAKE or cell == WALL:
+                distance = step
+                break
+        state = state * 5 + DISTANCE_BUCKET[distance]
+
+    side = 0
+    nearest = None
+    half_width, half_height = grid.width // 2, grid.height // 2
+    for x, y, birth in grid.bonus_cells:
+        # Bonuses which were eaten or expired are still listed until the end of their timeout.
+        cell = grid.get_point(x, y)[0]
+        if cell & KIND != BONUS:
+            continue
+        dx = (x - snake.x + half_width) % grid.width - half_width
+        dy = (y - snake.y + half_height) % grid.height - half_height
+        distance = abs(dx) + abs(dy)
+        if nearest is None or distance < nearest:
+            nearest = distance
+            if abs(dy) >= abs(dx):
+                direction = 0 if dy > 0 else 2
+            else:
+                direction = 1 if dx > 0 else 3
+            side = (direction - snake.dir) % 4 + 1
+    return state * 5 + side
+
+
+# QTable
+class QTable:
+
+    # Tables loaded from files, shared by every snake using them.
+    loaded = {}
+
+    def __init__(self, values: np.ndarray = None):
+        """
+        Dense table of the value of each action in each state, as a (STATES, ACTIONS) float32 array.
+            :param self:
+            :param values:np.ndarray: Values, a zero table if None.
+        """
+        self.values = values if values is not None else np.zeros((STATES, ACTIONS), dtype=np.float32)
+        # Best action of each state, computed once for greedy snakes.
+        self.policy = None
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH) -> 'QTable':
+        """
+        Returns the table saved into a file, memory mapped read only and shared by every caller.
+        None is returned if the file does not exist.
+            :param path:str: Path of the table.
+        """
+        if path not in cls.loaded:
+            if not os.path.exists(path):
+                return None
+            values = np.load(path, mmap_mode='r')
+            if values.shape != (STATES, ACTIONS):
+                raise ValueError("%s does not hold a table of %d states and %d actions." % (path, STATES, ACTIONS))
+            cls.loaded[path] = cls(values)
+        return cls.loaded[path]
+
+    def save(self, path: str = DEFAULT_PATH):
+        """
+        Saves the table. It is written next to the file first then renamed over it, so that readers never see
+        a partial table.
+            :param self:
+            :param path:str: Path of the table.
+        """
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.save(file, np.asarray(self.values, dtype=np.float32))
+        os.replace(temporary, path)
+        QTable.loaded.pop(path, None)
+
+    def best(self, state: int) -> int:
+        """
+        Returns the best action of a state.
+            :param self:
+            :param state:int: State of the snake.
+        """
+        if self.policy is None:
+            self.policy = np.argmax(self.values, axis=1).tolist()
+        return self.policy[state]
+
+
+# QLearner
+class QLearner:
+
+    def __init__(self, table: QTable, learning: bool = False, alpha: float = 0.1, gamma: float = 0.9,
+                 epsilon: float = 0.05, reward_weights: tuple = (1.0, -1.0, 0.5)):
+        """
+        Chooses the moves of a snake from a Q table. Greedy snakes only look up the best action of their state.
+        Learning snakes explore with probability epsilon and, on each move, update the value of their previous
+        move from the kills, deaths and bonuses it led to.
+            :param self:
+            :param table:QTable: Table of the values, shared between snakes.
+            :param learning:bool: Whether the snake explores and updates the table.
+            :param alpha:float: Learning rate.
+            :param gamma:float: Discount of the future values.
+            :param epsilon:float: Probability of a random move while learning.
+            :param reward_weights:tuple: Weights of the kill, dead and score counters in the rewards.
+        """
+        self.table = table
+        self.learning = learning
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.reward_weights = reward_weights
+        # State, action and counters of the previous move, for learning.
+        self.last = None
+
+    def search(self, grid, snake) -> int:
+        """
+        Returns the direction of a snake for the current tick.
+            :param self:
+            :param grid:Grid: Grid of the game.
+            :param snake:Snake: Snake to move.
+        """
+        state = encode(grid, snake)
+        if not self.learning:
+            return (snake.dir + TURNS[self.table.best(state)]) % 4
+
+        values = self.table.values
+        counters = (snake.kill, snake.dead, snake.score)
+        if self.last is not None:
+            last_state, last_action, last_counters = self.last
+            reward = sum(w * (now - before) for w, now, before in zip(self.reward_weights, counters, last_counters))
+            # A death ends the previous run of the snake, nothing follows it.
+            target = reward if counters[1] != last_counters[1] else reward + self.gamma * float(values[state].max())
+            values[last_state, last_action] += self.alpha * (target - values[last_state, last_action])
+
+        if snake.random.random() < self.epsilon:
+            action = snake.random.randrange(ACTIONS)
+        else:
+            action = int(np.argmax(values[state]))
+        self.last = (state, action, counters)
+        return (snake.dir + TURNS[action]) % 4
+
+
+def train(table: QTable, games: int = 100, ticks: int = 2000, seed: int = 0, roster: list = None, **learning) -> QTable:
+    """
+    Trains a table on headless games, where every 'qcpu' snake learns into it.
+        :param table:QTable: Table to train, updated in place.
+        :param games:int: Number of games.
+        :param ticks:int: Ticks of each game.
+        :param seed:int: Seed of the first game, the next ones following.
+        :param roster:list: Snakes of the games, four learning snakes, two CPUs and two drones by default.
+        :param learning: Parameters given to QLearner.
+    """
+    from pytron import make_game
+
+    if roster is None:
+        roster = [('qcpu', (0, 0, 0, 0), i + 1) for i in range(4)] + \
+                 [('cpu', (0, 0, 0, 0), 5), ('cpu', (0, 0, 0, 0), 6), ('drone', (0, 0, 0, 0), 8), ('drone', (0, 0, 0, 0), 8)]
+    planners = {'qcpu': lambda grid, snake: QLearner(table, True, **learning)}
+    for game_seed in range(seed, seed + games):
+        with make_game(arena_border = 0, roster = roster, seed = game_seed, planners = planners) as game:
+            game.run_headless(ticks)
+    table.policy = None
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trains the Q table of the qcpu snakes on headless games.")
+    parser.add_argument("--games", type=int, default=100, help="number of games")
+    parser.add_argument("--ticks", type=int, default=2000, help="ticks of each game")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--epsilon", type=float, default=0.05, help="probability of a random move")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="table to train, created if missing")
+    args = parser.parse_args()
+
+    loaded = QTable.load(args.path)
+    table = QTable(np.array(loaded.values, dtype=np.float32)) if loaded is not None else QTable()
+    train(table, args.games, args.ticks, args.seed, epsilon = args.epsilon)
+    table.save(args.path)
+    print("Saved %s" % args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from pyglet import window, clock, image
+from pyglet.gl import *  # pylint: disable=unused-wildcard-import
+from pyglet import font
+from pyglet.font import Text
+import numpy as np
+
+from cells import WALL, SNAKE, BONUS, KIND, KIND_BITS, GOOD_BONUS, id_count
+
+# Renderer
+class Renderer:
+
+    def __init__(self, game):
+        """
+        Creates the window of a game and everything needed to draw it.
+        This is the only part of Pytron using Pyglet, the game runs without it when not drawn.
+            :param self:
+            :param game:Game: Game to draw.
+        """
+        self.arena_width = game.arena_width
+        self.arena_height = game.arena_height
+        self.arena_border = game.arena_border
+        self.square_size = game.square_size
+        self.screen_height = game.screen_height
+
+        self.win = window.Window(width = game.screen_width, height = game.screen_height, visible=False)
+        self.header_img = image.load("header.png").texture
+        clock.set_fps_limit(game.fps)
+        self.font = font.load("Arial", 12, bold = True, italic = False)
+        self.arena_verts = [
+            (self.arena_border-1, self.arena_border-2),
+            (self.arena_border+self.arena_width+1, self.arena_border-2),
+            (self.arena_border+self.arena_width+1, self.arena_border+self.arena_height),
+            (self.arena_border-1, self.arena_border+self.arena_height),
+            (self.arena_border-1, self.arena_border-2)
+        ]
+        self.points_coord = [
+            (150, self.screen_height - 20),
+            (150, self.screen_height - 40),
+            (420, self.screen_height - 20),
+            (420, self.screen_height - 40)
+        ]
+        self.colors = [
+            (0, 0, 0),
+            (0, 0, 1),
+            (1, 1, 0),
+            (1, 0, 1),
+            (0, 1, 1),
+            (0.5, 0.5, 0),
+            (0.5, 0, 0.5),
+            (0, 0.5, 0.5),
+            (1, 1, 1),
+            (1, 1, 1),
+            (1, 1, 1),
+            (0, 1, 0),
+            (1, 0, 0)
+        ]
+        self.square_verts = [
+            (0, 0),
+            (self.square_size-1, 0),
+            (self.square_size-1, self.square_size-1),
+            (0, self.square_size-1)
+        ]
+        self.init_cells(game.grid_width, game.grid_height)
+
+    def init_cells(self, width: int, height: int):
+        """
+        Creates the vertex buffers of the cells: one quad per cell, in the order of the grid's [y, x] arrays.
+        The positions never change and are uploaded once, the colors are uploaded when cells change.
+            :param self:
+            :param width:int: Width of the grid.
+            :param height:int: Height of the grid.
+        """
+        self.cell_count = width * height
+        corners = np.array(self.square_verts, dtype=np.float32)
+        verts = np.empty((height, width, 4, 2), dtype=np.float32)
+        verts[..., 0] = (self.arena_border + np.arange(width) * self.square_size)[None, :, None] + corners[:, 0]
+        verts[..., 1] = (self.arena_border + np.arange(height) * self.square_size)[:, None, None] + corners[:, 1]
+        self.vertex_buffer = GLuint()
+        glGenBuffers(1, self.vertex_buffer)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, verts.nbytes, verts.ctypes.data, GL_STATIC_DRAW)
+
+        # RGBA of the four vertices of each cell, as drawn by the color buffer.
+        self.cell_colors = np.zeros((self.cell_count, 4, 4), dtype=np.uint8)
+        self.color_buffer = GLuint()
+        glGenBuffers(1, self.color_buffer)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.cell_colors.nbytes, self.cell_colors.ctypes.data, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        # Cells which changed since the last frame, as given by the grid after each tick.
+        # Every cell is drawn on the first frame.
+        self.changed_cells = set()
+        self.all_changed = True
+
+    def cells_changed(self, dirty: set):
+        """
+        Observer of the grid, keeping the cells which changed during a tick until the next frame.
+            :param self:
+            :param dirty:set: Flat indices of the cells which changed.
+        """
+        self.changed_cells |= dirty
+
+    def begin_frame(self, stats = None):
+        """
+        Handles the window events and draws the parts of the frame which are not the grid.
+            :param self:
+            :param stats:TickStats: Stats of the game, shown in the caption if given.
+        """
+        self.win.dispatch_events()
+        clock.tick()
+        caption = 'Pytron v0.5 (fps: %s)' % (round(clock.get_fps()))
+        if stats is not None:
+            caption += ' ' + stats.summary()
+        self.win.set_caption(caption)
+
+        glClear(GL_COLOR_BUFFER_BIT)
+        glLoadIdentity()
+
+        self.draw_header()
+        self.draw_arena()
+
+    def end_frame(self, grid):
+        """
+        Draws the grid and the points, then displays the frame.
+            :param self:
+            :param grid:Grid: Grid to draw.
+        """
+        self.draw_cells(grid)
+        self.draw_points(grid)
+        self.win.flip()
+
+    def draw_header(self):
+        glColor3f(1, 1, 1)
+        self.header_img.blit(self.arena_border, self.arena_border + self.arena_border + self.arena_height)
+
+    def draw_points(self, grid):
+        for snake in grid.snakes:
+            # Only the first snakes have room for their points.
+            if snake.type != 'drone' and snake.id <= len(self.points_coord):
+                text = "KILL %-3d, DEATH %-3d, BONUS %-3d" % (
+                    snake.kill, snake.dead, snake.score)
+                x, y = self.points_coord[snake.id - 1]
+                r, g, b = self.colors[snake.color]
+                txt = Text(self.font, text, x, y, color=(r, g, b, 1))
+                txt.draw()
+
+    def draw_arena(self):
+        glBegin(GL_LINES)
+        glColor3f(0.5, 0.5, 0.5)
+        for i in range(4):
+            glVertex2f(*(self.arena_verts[i]))
+            glVertex2f(*(self.arena_verts[i + 1]))
+        glEnd()
+
+    def cells_palette(self, grid) -> np.ndarray:
+        """
+        Returns the color of each cell id, as an (id_count, 3) array.
+            :param self:
+            :param grid:Grid: Grid to draw.
+        """
+        palette = np.zeros((id_count(len(grid.snakes)), 3), dtype=np.float32)
+        for snake in grid.snakes:
+            palette[snake.cell] = self.colors[snake.color]
+        palette[BONUS::1 << KIND_BITS] = self.colors[12]  # Mild bonuses
+        palette[GOOD_BONUS] = self.colors[11]  # Good bonus
+        palette[WALL] = self.colors[10]  # Wall
+        return palette
+
+    def update_cells(self, grid):
+        """
+        Computes the colors of the cells which changed since the last frame, and uploads them.
+            :param self:
+            :param grid:Grid: Grid to draw. Must be called after the cells were expired.
+        """
+        if self.all_changed:
+            changed = np.arange(self.cell_count)
+            ids, ages = grid.get_arrays()
+            ids, ages = ids.reshape(-1), ages.reshape(-1)
+            self.all_changed = False
+        elif self.changed_cells:
+            changed = np.fromiter(self.changed_cells, dtype=np.int64, count=len(self.changed_cells))
+            changed.sort()
+            ids, ages = grid.get_cells(changed)
+        else:
+            return
+        self.changed_cells = set()
+
+        # The fade is based on the age the cell had before the tick ended.
+        fade = np.where(ids & KIND == SNAKE, np.maximum(1 - 0.005 * (ages - 1), 0.4), 1)
+        colors = np.empty((len(changed), 4), dtype=np.uint8)
+        colors[:, :3] = self.cells_palette(grid)[ids] * fade[:, None] * 255
+        colors[:, 3] = 255
+        self.cell_colors[changed] = colors[:, None, :]
+
+        # Changed cells closer than 64 cells are uploaded together, to limit the number of calls.
+        breaks = np.flatnonzero(np.diff(changed) > 64)
+        starts = np.concatenate((changed[:1], changed[breaks + 1]))
+        ends = np.concatenate((changed[breaks], changed[-1:])) + 1
+        cell_bytes = self.cell_colors[0].nbytes
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        for start, end in zip(starts, ends):
+            glBufferSubData(GL_ARRAY_BUFFER, int(start) * cell_bytes, int(end - start) * cell_bytes,
+                            self.cell_colors[start:end].ctypes.data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw_cells(self, grid):
+        """
+        Draws every cell of the grid from the vertex buffers. Empty cells are drawn black.
+            :param self:
+            :param grid:Grid: Grid to draw. Must be called after the cells were expired.
+        """
+        self.update_cells(grid)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glVertexPointer(2, GL_FLOAT, 0, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(4, GL_UNSIGNED_BYTE, 0, 0)
+        glDrawArrays(GL_QUADS, 0, self.cell_count * 4)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisableClientState(GL_COLOR_ARRAY)
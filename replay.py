@@ -0,0 +1,289 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from random import Random
+import argparse
+import json
+import struct
+import numpy as np
+
+from cells import SNAKE, BONUS, KIND, KIND_BITS
+from pytron import ArrayGrid, Grid, Snake
+
+# A replay file is made of a header, followed by blocks of the same size: a keyframe holding the whole
+# state of the game, then the deltas of the next keyframe_interval ticks. The last block may be shorter.
+# The offset of any tick is thus known without reading the file, which is read through a memory map.
+MAGIC = b'PYTRONRP'
+VERSION = 2
+# magic, version, width, height, snakes, keyframe_interval, bonus_timeout, single_life, roster length.
+HEADER = struct.Struct('<8sHIIHIIBI')
+
+
+def keyframe_dtype(width: int, height: int, snakes: int) -> np.dtype:
+    """
+    Returns the type of a keyframe: the cells of the grid and the state of its snakes.
+    Bodies and bonuses are rebuilt from the ages of the cells, which never exceed 65535.
+        :param width:int: Width of the grid.
+        :param height:int: Height of the grid.
+        :param snakes:int: Number of snakes.
+    """
+    return np.dtype([
+        ('tick', '<i8'),
+        ('ids', '<u2', (height, width)),
+        ('ages', '<u2', (height, width)),
+        ('x', '<i4', snakes),
+        ('y', '<i4', snakes),
+        ('new_x', '<i4', snakes),
+        ('new_y', '<i4', snakes),
+        ('dir', 'u1', snakes),
+        ('new_dir', 'u1', snakes),
+        ('tail', '<i4', snakes),
+        ('reset', 'u1', snakes),
+        ('kill', '<i4', snakes),
+        ('dead', '<i4', snakes),
+        ('score', '<i4', snakes)
+    ])
+
+
+def delta_dtype(snakes: int) -> np.dtype:
+    """
+    Returns the type of the delta of a tick: the bonus added, if any, the direction taken by each snake
+    and the increase of its counters.
+        :param snakes:int: Number of snakes.
+    """
+    return np.dtype([
+        ('bonus_x', '<u2'),
+        ('bonus_y', '<u2'),
+        ('bonus', '<u2'),
+        ('dir', 'u1', snakes),
+        ('kill', 'u1', snakes),
+        ('dead', 'u1', snakes),
+        ('score', 'u1', snakes)
+    ])
+
+
+def counters(grid: Grid) -> np.ndarray:
+    """
+    Returns the kill, dead and score counters of the snakes of a grid, as a (3, snakes) array.
+        :param grid:Grid: Grid of the game.
+    """
+    return np.array([[snake.kill for snake in grid.snakes],
+                     [snake.dead for snake in grid.snakes],
+                     [snake.score for snake in grid.snakes]], dtype=np.int64).reshape(3, -1)
+
+
+class Recorder:
+
+    def __init__(self, grid: Grid, path: str, single_life: bool, keyframe_interval: int = 256):
+        """
+        Records a game into a replay file, from now on. The recorder observes the grid, writing a delta after each tick.
+            :param self:
+            :param grid:Grid: Grid of the game, with all its snakes.
+            :param path:str: Path of the replay file.
+            :param single_life:bool: Whether the game is in single life.
+            :param keyframe_interval:int: Number of ticks between two keyframes.
+        """
+        self.grid = grid
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_dtype = keyframe_dtype(grid.width, grid.height, len(grid.snakes))
+        self.delta_dtype = delta_dtype(len(grid.snakes))
+        self.ticks = 0
+        self.counters = counters(grid)
+
+        roster = json.dumps([[snake.type, snake.color] for snake in grid.snakes]).encode()
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, grid.width, grid.height, len(grid.snakes), keyframe_interval,
+                                    grid.bonus_timeout, single_life, len(roster)))
+        self.file.write(roster)
+        self.write_keyframe()
+        grid.observers.append(self.tick_done)
+
+    def write_keyframe(self):
+        """
+        Writes the whole state of the game.
+            :param self:
+        """
+        keyframe = np.zeros((), dtype=self.keyframe_dtype)
+        keyframe['tick'] = self.grid.tick
+        ids, ages = self.grid.get_arrays()
+        keyframe['ids'] = ids
+        keyframe['ages'] = ages
+        for field in ('x', 'y', 'new_x', 'new_y', 'dir', 'new_dir', 'tail', 'reset', 'kill', 'dead', 'score'):
+            keyframe[field] = [getattr(snake, field) for snake in self.grid.snakes]
+        self.file.write(keyframe.tobytes())
+
+    def tick_done(self, dirty: set):
+        """
+        Observer of the grid, writing the delta of the tick which just ended.
+            :param self:
+            :param dirty:set: Cells which changed, unused.
+        """
+        delta = np.zeros((), dtype=self.delta_dtype)
+        if self.grid.last_bonus is not None:
+            delta['bonus_x'], delta['bonus_y'], delta['bonus'] = self.grid.last_bonus
+        delta['dir'] = [snake.dir for snake in self.grid.snakes]
+        now = counters(self.grid)
+        delta['kill'], delta['dead'], delta['score'] = now - self.counters
+        self.counters = now
+        self.file.write(delta.tobytes())
+
+        self.ticks += 1
+        if self.ticks % self.keyframe_interval == 0:
+            self.write_keyframe()
+
+    def close(self):
+        """
+        Stops recording and closes the file.
+            :param self:
+        """
+        self.grid.observers.remove(self.tick_done)
+        self.file.close()
+
+
+class Replay:
+
+    def __init__(self, path: str):
+        """
+        Opens a replay file through a memory map. Nothing but the header is read until needed.
+            :param self:
+            :param path:str: Path of the replay file.
+        """
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, self.width, self.height, snakes, self.keyframe_interval, self.bonus_timeout, single_life, \
+            roster_length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a replay file of this version." % path)
+        self.single_life = bool(single_life)
+        self.roster = json.loads(bytes(self.data[HEADER.size:HEADER.size + roster_length]))
+        self.keyframe_dtype = keyframe_dtype(self.width, self.height, snakes)
+        self.delta_dtype = delta_dtype(snakes)
+
+        self.start = HEADER.size + roster_length
+        self.block_size = self.keyframe_dtype.itemsize + self.keyframe_interval * self.delta_dtype.itemsize
+        blocks, rest = divmod(len(self.data) - self.start, self.block_size)
+        # The recorder writes a keyframe after the last delta of a block, it is missing if the file was cut there.
+        if rest >= self.keyframe_dtype.itemsize:
+            self.keyframes = blocks + 1
+            self.ticks = blocks * self.keyframe_interval + (rest - self.keyframe_dtype.itemsize) // self.delta_dtype.itemsize
+        else:
+            self.keyframes = blocks
+            self.ticks = blocks * self.keyframe_interval
+        if self.keyframes == 0:
+            raise ValueError("%s has no keyframe." % path)
+
+    def keyframe(self, index: int) -> np.ndarray:
+        """
+        Returns a keyframe, the state of the game after index * keyframe_interval ticks.
+            :param self:
+            :param index:int: Index of the keyframe.
+        """
+        offset = self.start + index * self.block_size
+        return np.frombuffer(self.data, dtype=self.keyframe_dtype, count=1, offset=offset)[0]
+
+    def deltas(self, index: int) -> np.ndarray:
+        """
+        Returns the deltas following a keyframe, as an array of at most keyframe_interval ticks.
+            :param self:
+            :param index:int: Index of the keyframe.
+        """
+        count = min(self.keyframe_interval, self.ticks - index * self.keyframe_interval)
+        offset = self.start + index * self.block_size + self.keyframe_dtype.itemsize
+        return np.frombuffer(self.data, dtype=self.delta_dtype, count=max(count, 0), offset=offset)
+
+    def restore(self, keyframe: np.ndarray, array_grid: bool = False) -> Grid:
+        """
+        Builds a grid in the state of a keyframe.
+            :param self:
+            :param keyframe:np.ndarray: Keyframe to restore.
+            :param array_grid:bool: Whether the grid is stored into NumPy arrays.
+        """
+        grid_class = ArrayGrid if array_grid else Grid
+        grid = grid_class(self.width, self.height, self.bonus_timeout)
+        grid.tick = int(keyframe['tick'])
+        for i, (snakeType, color) in enumerate(self.roster):
+            snake = Snake(i + 1, snakeType, (0, 0, 0, 0), color, (0, 0), Random(0))
+            for field in ('x', 'y', 'new_x', 'new_y', 'dir', 'new_dir', 'tail', 'kill', 'dead', 'score'):
+                setattr(snake, field, int(keyframe[field][i]))
+            snake.reset = bool(keyframe['reset'][i])
+            grid.snakes.append(snake)
+
+        ids = keyframe['ids']
+        ages = keyframe['ages'].astype(np.int64)
+        ys, xs = np.nonzero(ids)
+        # Oldest cells first, so that bodies and bonuses are rebuilt in order.
+        order = np.argsort(-ages[ys, xs], kind='stable')
+        for y, x in zip(ys[order].tolist(), xs[order].tolist()):
+            state, age = int(ids[y, x]), int(ages[y, x])
+            grid.set_point(x, y, (state, age))
+            kind = state & KIND
+            if kind == SNAKE:
+                grid.snakes[(state >> KIND_BITS) - 1].body.append((x, y, grid.tick - age))
+            elif kind == BONUS:
+                grid.bonus_cells.append((x, y, grid.tick - age))
+        return grid
+
+    def apply(self, grid: Grid, delta: np.ndarray):
+        """
+        Replays one tick on a grid.
+            :param self:
+            :param grid:Grid: Grid in the state before the tick.
+            :param delta:np.ndarray: Delta of the tick.
+        """
+        if delta['bonus'] != 0:
+            grid.place_bonus(int(delta['bonus_x']), int(delta['bonus_y']), int(delta['bonus']))
+        grid.update_grid(self.single_life, delta['dir'].tolist())
+
+    def grid_at(self, tick: int, array_grid: bool = False) -> Grid:
+        """
+        Returns the grid after some ticks, replaying from the closest keyframe.
+            :param self:
+            :param tick:int: Number of ticks from the start of the recording.
+            :param array_grid:bool: Whether the grid is stored into NumPy arrays.
+        """
+        if tick < 0 or tick > self.ticks:
+            raise IndexError("Tick %d is outside of the replay, which has %d ticks." % (tick, self.ticks))
+        index = min(tick // self.keyframe_interval, self.keyframes - 1)
+        grid = self.restore(self.keyframe(index), array_grid)
+        for delta in self.deltas(index)[:tick - index * self.keyframe_interval]:
+            self.apply(grid, delta)
+        return grid
+
+    def events(self) -> list:
+        """
+        Returns the kills, deaths and bonuses of the whole replay, as (tick, snake id, counter, increase) tuples.
+        Only the deltas are read.
+            :param self:
+        """
+        events = []
+        for index in range(self.keyframes):
+            deltas = self.deltas(index)
+            for counter in ('dead', 'kill', 'score'):
+                ticks, snakes = np.nonzero(deltas[counter])
+                for tick, snake in zip(ticks.tolist(), snakes.tolist()):
+                    events.append((index * self.keyframe_interval + tick, snake + 1, counter,
+                                   int(deltas[counter][tick, snake])))
+        events.sort()
+        return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reads a replay file recorded by pytron.py --record.")
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("--tick", type=int, default=None, help="print the snakes after this tick")
+    parser.add_argument("--events", action="store_true", help="print every kill, death and bonus")
+    args = parser.parse_args()
+
+    replay = Replay(args.path)
+    print("%d x %d grid, %d ticks, snakes: %s" % (replay.width, replay.height, replay.ticks,
+                                                  ", ".join(snakeType for snakeType, color in replay.roster)))
+    if args.events:
+        for tick, snake, counter, increase in replay.events():
+            print("tick %-8d snake %-3d %s +%d" % (tick, snake, counter, increase))
+    if args.tick is not None:
+        grid = replay.grid_at(args.tick)
+        for snake in grid.snakes:
+            print("snake %-3d %-6s at (%d, %d) dir %d tail %-3d KILL %-3d DEATH %-3d BONUS %-3d" % (
+                snake.id, snake.type, snake.x, snake.y, snake.dir, snake.tail, snake.kill, snake.dead, snake.score))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import threading
+import numpy as np
+
+from cells import WALL, SNAKE, KIND, id_count
+
+# Step from which a wall may be entered, never.
+NEVER = 1 << 30
+
+
+def window_axis(center: int, size: int, horizon: int) -> tuple:
+    """
+    Returns the coordinates covered by a window along an axis of the grid, and whether the window wraps around.
+    A window holds the cells at most horizon cells away from its center, or the whole axis when it is not larger.
+        :param center:int: Coordinate of the center of the window.
+        :param size:int: Size of the axis of the grid.
+        :param horizon:int: Half width of the window.
+    """
+    if 2 * horizon + 1 < size:
+        return (np.arange(center - horizon, center + horizon + 1) % size, False)
+    return (np.arange(size), True)
+
+
+def window_index(coords: np.ndarray, axis: tuple, size: int) -> np.ndarray:
+    """
+    Returns the index of some coordinates into a window along an axis of the grid, -1 for those out of it.
+        :param coords:np.ndarray: Coordinates along the axis of the grid.
+        :param axis:tuple: Coordinates and wrap of the window, as returned by window_axis.
+        :param size:int: Size of the axis of the grid.
+    """
+    cells, wrap = axis
+    if wrap:
+        return coords
+    index = (coords - cells[0]) % size
+    return np.where(index < len(cells), index, -1)
+
+
+# Window
+class Window:
+
+    __slots__ = ('rows', 'cols', 'waits', 'steps')
+
+    def __init__(self, rows: tuple, cols: tuple, waits: np.ndarray, steps: np.ndarray):
+        """
+        Flood of a head, on the window of the grid around it which the flood may reach.
+            :param self:
+            :param rows:tuple: Rows of the window and whether they wrap, as returned by window_axis.
+            :param cols:tuple: Columns of the window and whether they wrap.
+            :param waits:np.ndarray: First step at which each cell of the window may be entered.
+            :param steps:np.ndarray: Step at which the head reaches each cell of the window.
+        """
+        self.rows = rows
+        self.cols = cols
+        self.waits = waits
+        self.steps = steps
+
+
+# Territory
+class Territory:
+
+    def __init__(self, horizon: int = 24):
+        """
+        Floods of the heads of the snakes of a grid, at most horizon steps deep, shared by all the flood snakes
+        of the grid. They are computed once per tick, by the first flood snake searching its move, each one only
+        over the window of the cells its head may reach, so their cost does not grow with the size of the grid.
+        The ids and births of the cells are mirrored from the grid, which is observed so that only the cells
+        changed are read again.
+            :param self:
+            :param horizon:int: Number of ticks the floods look ahead.
+        """
+        self.horizon = horizon
+        # Mirror of the ids and births of the cells, indexed by [y, x], of the grid observed.
+        self.ids = None
+        self.births = None
+        self.grid = None
+        # Cells changed by the ticks which ended since the last update.
+        self.changed = set()
+        # Tick of the floods, and the Window of each snake whose head is on the grid, by index of the snake.
+        self.tick = None
+        self.windows = {}
+        # Flood snakes may search their moves concurrently, the first one computing the floods.
+        self.lock = threading.Lock()
+
+    def tick_done(self, dirty: set):
+        """
+        Observer of the grid, keeping the cells changed by the tick which just ended.
+            :param self:
+            :param dirty:set: Flat indices of the cells which changed.
+        """
+        self.changed |= dirty
+
+    def sync(self, grid):
+        """
+        Updates the mirror of the cells. The whole grid is read the first time, it is then observed
+        and only the cells which changed since are read.
+            :param self:
+            :param grid:Grid: Grid of the game.
+        """
+        if grid is not self.grid:
+            if self.grid is not None:
+                self.grid.observers.remove(self.tick_done)
+            grid.observers.append(self.tick_done)
+            self.grid = grid
+            self.tick = None
+            ids, ages = grid.get_arrays()
+            self.ids = ids.copy()
+            self.births = grid.tick - ages
+            self.changed = set()
+            return
+        # Cells changed during the last ticks, and during this one by the bonus.
+        changed = self.changed | grid.dirty
+        self.changed = set()
+        if changed:
+            cells = np.fromiter(changed, dtype=np.int64, count=len(changed))
+            ids, ages = grid.get_cells(cells)
+            self.ids.reshape(-1)[cells] = ids
+            self.births.reshape(-1)[cells] = grid.tick - ages
+
+    def prepare(self, grid):
+        """
+        Makes sure the floods of the heads are those of the current tick of the grid.
+            :param self:
+            :param grid:Grid: Grid of the game.
+        """
+        with self.lock:
+            if grid is self.grid and grid.tick == self.tick:
+                return
+            self.sync(grid)
+            tails = np.zeros(id_count(len(grid.snakes)), dtype=np.int64)
+            for snake in grid.snakes:
+                tails[snake.cell] = snake.tail
+            # Windows all have the same shape, so the heads are flooded together, each on its own layer.
+            heads = [i for i, snake in enumerate(grid.snakes) if snake.type != 'drone' and snake.x >= 0]
+            windows = []
+            sources = []
+            for i in heads:
+                snake = grid.snakes[i]
+                rows = window_axis(snake.y, grid.height, self.horizon)
+                cols = window_axis(snake.x, grid.width, self.horizon)
+                windows.append(Window(rows, cols, self.waits(grid, rows, cols, tails), None))
+                sources.append((int(window_index(np.array([snake.y]), rows, grid.height)[0]),
+                                int(window_index(np.array([snake.x]), cols, grid.width)[0])))
+            if windows:
+                steps = self.floods(np.stack([window.waits for window in windows]), windows[0].rows[1],
+                                    windows[0].cols[1], sources, 0)
+                for window, layer in zip(windows, steps):
+                    window.steps = layer
+            self.windows = dict(zip(heads, windows))
+            self.tick = grid.tick
+
+    def waits(self, grid, rows: tuple, cols: tuple, tails: np.ndarray) -> np.ndarray:
+        """
+        Returns, for each cell of a window, the first step from now at which a snake may enter it.
+        A cell entered at step k is entered during tick grid.tick + k - 1, and a snake cell born at tick b
+        is cleared at the end of tick b + tail + 1.
+            :param self:
+            :param grid:Grid: Grid of the game, synced.
+            :param rows:tuple: Rows of the window.
+            :param cols:tuple: Columns of the window.
+            :param tails:np.ndarray: Tail of the snake of each cell id.
+        """
+        cells = np.ix_(rows[0], cols[0])
+        ids = self.ids[cells]
+        waits = np.where(ids & KIND == SNAKE, self.births[cells] + tails[ids] + 3 - grid.tick, 0)
+        waits[ids == WALL] = NEVER
+        return waits
+
+    def floods(self, waits: np.ndarray, wrap_rows: bool, wrap_cols: bool, sources: list, step: int) -> np.ndarray:
+        """
+        Returns the step at which each cell of a window is first reached from each source, as a (sources, rows, cols)
+        array. Cells out of reach hold horizon + 1. A cell blocked when first touched may be reached later,
+        once expired, as the snake can wander meanwhile.
+            :param self:
+            :param waits:np.ndarray: First step at which each cell of the window may be entered, or of the window
+                of each source, as a (sources, rows, cols) array.
+            :param wrap_rows:bool: Whether the rows of the window wrap around, the window holding all of them.
+            :param wrap_cols:bool: Whether the columns of the window wrap around.
+            :param sources:list: (row, col) of the sources into the window.
+            :param step:int: Step of the sources, 0 for heads and 1 for the cells they may move to.
+        """
+        shape = (len(sources),) + waits.shape[-2:]
+        reached = np.zeros(shape, dtype=bool)
+        steps = np.full(shape, self.horizon + 1, dtype=np.int16)
+        for layer, (row, col) in enumerate(sources):
+            reached[layer, row, col] = True
+            steps[layer, row, col] = step
+
+        for depth in range(step + 1, self.horizon + 1):
+            grown = reached.copy()
+            grown[:, 1:, :] |= reached[:, :-1, :]
+            grown[:, :-1, :] |= reached[:, 1:, :]
+            grown[:, :, 1:] |= reached[:, :, :-1]
+            grown[:, :, :-1] |= reached[:, :, 1:]
+            if wrap_rows:
+                grown[:, 0, :] |= reached[:, -1, :]
+                grown[:, -1, :] |= reached[:, 0, :]
+            if wrap_cols:
+                grown[:, :, 0] |= reached[:, :, -1]
+                grown[:, :, -1] |= reached[:, :, 0]
+            # Cells next to the floods which are not free yet stop them only if they never will be.
+            pending = grown & ~reached & (waits < NEVER)
+            if not pending.any():
+                break
+            new = pending & (waits <= depth)
+            steps[new] = depth
+            reached |= new
+        return steps
+
+    def others(self, grid, i: int) -> np.ndarray:
+        """
+        Returns the first step at which any other snake reaches each cell of the window of a snake.
+            :param self:
+            :param grid:Grid: Grid of the game, prepared.
+            :param i:int: Index of the snake.
+        """
+        window = self.windows[i]
+        others = np.full(window.steps.shape, self.horizon + 1, dtype=np.int16)
+        for j, other in self.windows.items():
+            if j == i:
+                continue
+            rows = window_index(window.rows[0], other.rows, grid.height)
+            cols = window_index(window.cols[0], other.cols, grid.width)
+            mine_rows, mine_cols = np.flatnonzero(rows >= 0), np.flatnonzero(cols >= 0)
+            if len(mine_rows) == 0 or len(mine_cols) == 0:
+                continue
+            cells = np.ix_(mine_rows, mine_cols)
+            others[cells] = np.minimum(others[cells], other.steps[np.ix_(rows[mine_rows], cols[mine_cols])])
+        return others
+
+
+# VoronoiFill
+class VoronoiFill:
+
+    def __init__(self, territory: Territory = None):
+        """
+        Chooses the moves of a snake by the space it would own within a bounded horizon: a flood fill from each
+        candidate head, at most horizon steps deep, split into a Voronoi partition against the heads of the other
+        snakes, on the wrapping grid. Cells beyond the horizon are not counted, so this is not the whole reachable
+        territory. Snake cells are entered only once they will have expired, according to their age and the tail
+        of their snake.
+        The floods of the heads come from a Territory, computed once per tick for all the flood snakes sharing it,
+        and only the floods of the three candidates are computed for each move, all on windows of the grid.
+            :param self:
+            :param territory:Territory: Floods shared with the other flood snakes of the grid, a new one if None.
+        """
+        self.territory = territory if territory is not None else Territory()
+
+    def values(self, grid, snake) -> list:
+        """
+        Returns the value of each direction the snake may take, as (direction, (owned, reachable)) tuples:
+        the cells it reaches before any other snake, then the cells it reaches at all. Moves into a cell not
+        free yet are worth (-1, 0), and moves onto a cell another head may reach on the same tick own half.
+            :param self:
+            :param grid:Grid: Grid of the game.
+            :param snake:Snake: Snake to move.
+        """
+        territory = self.territory
+        territory.prepare(grid)
+        i = grid.snakes.index(snake)
+        window = territory.windows[i]
+        others = territory.others(grid, i)
+        horizon = territory.horizon
+
+        directions = (snake.dir, (snake.dir + 1) % 4, (snake.dir + 3) % 4)
+        candidates = []
+        for direction in directions:
+            xs, ys = grid.ahead[1][direction]
+            candidates.append((int(window_index(np.array([ys[snake.y]]), window.rows, grid.height)[0]),
+                               int(window_index(np.array([xs[snake.x]]), window.cols, grid.width)[0])))
+        steps = territory.floods(window.waits, window.rows[1], window.cols[1], candidates, 1)
+
+        values = []
+        for c, (direction, (row, col)) in enumerate(zip(directions, candidates)):
+            mine = steps[c]
+            if window.waits[row, col] > 1:
+                value = (-1, 0)
+            else:
+                reachable = int(np.count_nonzero(mine <= horizon))
+                owned = int(np.count_nonzero(mine < others))
+                if others[row, col] <= 1:
+                    owned //= 2
+                value = (owned, reachable)
+            values.append((direction, value))
+        return values
+
+    def search(self, grid, snake) -> int:
+        """
+        Returns the direction leading to the most space owned by the snake, as valued by values.
+            :param self:
+            :param grid:Grid: Grid of the game.
+            :param snake:Snake: Snake to move.
+        """
+        best, best_value = snake.dir, None
+        for direction, value in self.values(grid, snake):
+            # Ties keep the current direction, the first candidate.
+            if best_value is None or value > best_value:
+                best, best_value = direction, value
+        return best
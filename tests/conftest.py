@@ -0,0 +1,7 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import os
+import sys
+
+# The modules of Pytron live at the root of the repository, next to this folder.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,156 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+import pytest
+
+from batch import DIR_X, DIR_Y, BatchGrid
+from cells import EMPTY, WALL, AGED, GOOD_BONUS, snake_cell
+from pytron import DEFAULT_WALLS, LOOKAHEAD, Grid, Snake
+from tournament import make_roster
+
+# Humans go straight ahead in both engines, so their games only depend on the starting positions and the bonuses.
+HUMANS = make_roster(['human'] * 6)
+CPUS = make_roster(['cpu'] * 4 + ['drone'] * 2)
+
+
+class Draws:
+    """
+    Stands for the random generator of a snake of the grid, choosing what the batch drew for it.
+    """
+
+    def __init__(self):
+        self.draws = {}
+
+    def choice(self, seq):
+        if seq is LOOKAHEAD:
+            return seq[self.draws['lookahead']]
+        if any(seq is row for row in Snake.cpu_avoid):
+            return seq[self.draws['avoid']]
+        return seq[self.draws['ai']]
+
+
+class Recorder:
+    """
+    Stands for the random generator of the batch, keeping the integers it draws.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = []
+
+    def integers(self, low, high, size):
+        draws = self.rng.integers(low, high, size)
+        self.draws.append(draws)
+        return draws
+
+
+class Mirror:
+    """
+    Grid following the first game of a batch: it starts each match from the same positions, and gets the same bonuses
+    and the same random draws for its CPUs and drones.
+    """
+
+    def __init__(self, batch: BatchGrid, roster: list):
+        self.batch = batch
+        self.roster = roster
+        self.restart()
+
+        show_bonus = batch.show_bonus
+        def mirrored_show_bonus():
+            count = len(batch.bonus_cells)
+            show_bonus()
+            if len(batch.bonus_cells) > count:
+                tick, g, cells = batch.bonus_cells[-1]
+                if len(g) > 0 and g[0] == 0:
+                    y, x = divmod(int(cells[0]), batch.width)
+                    self.grid.place_bonus(x, y, int(batch.ids[0, y, x]))
+        batch.show_bonus = mirrored_show_bonus
+
+        select_new_direction = batch.select_new_direction
+        def mirrored_select_new_direction(g, s):
+            rng = batch.random
+            batch.random = Recorder(rng)
+            select_new_direction(g, s)
+            draws, batch.random = batch.random.draws, rng
+            if len(g) > 0 and g[0] == 0:
+                keys = ('lookahead', 'ai', 'avoid') if batch.cpu[s] else ('ai',)
+                self.grid.snakes[s].random.draws = {key: int(d[0]) for key, d in zip(keys, draws)}
+        batch.select_new_direction = mirrored_select_new_direction
+
+    def restart(self):
+        """
+        Starts the grid from the match the first game of the batch just started.
+        """
+        batch = self.batch
+        self.grid = Grid(batch.width, batch.height)
+        for bottom_left, top_right in DEFAULT_WALLS:
+            self.grid.new_wall(bottom_left, top_right)
+        for s, (snakeType, keys, color) in enumerate(self.roster):
+            snake = Snake(s + 1, snakeType, keys, color, (int(batch.x[0, s]), int(batch.y[0, s])))
+            snake.dir = snake.new_dir = int(batch.dir[0, s])
+            snake.random = Draws()
+            self.grid.snakes.append(snake)
+            self.grid.place_snake(snake)
+
+    def counters(self) -> list:
+        return [(s.kill, s.dead, s.score) for s in self.grid.snakes]
+
+    def check(self, tick: int):
+        batch = self.batch
+        ids, ages = self.grid.get_arrays()
+        assert np.array_equal(batch.ids[0], ids), tick
+        assert np.array_equal(np.where(batch.ids[0] & AGED, batch.tick - batch.births[0], 0), ages), tick
+        assert self.counters() == list(zip(batch.kill[0].tolist(), batch.dead[0].tolist(), batch.score[0].tolist())), tick
+
+
+@pytest.mark.parametrize('roster', [HUMANS, CPUS], ids=['humans', 'cpus'])
+@pytest.mark.parametrize('single_life', [False, True])
+def test_batch_matches_grid(roster, single_life):
+    batch = BatchGrid(4, 72, 48, roster, DEFAULT_WALLS, single_life, seed = 5)
+    mirror = Mirror(batch, roster)
+    for tick in range(600):
+        ended = batch.step()
+        if ended[0]:
+            break
+        mirror.grid.update_grid(single_life)
+        mirror.check(tick)
+    assert tick > 50
+
+
+@pytest.mark.parametrize('state', [EMPTY, WALL, snake_cell(2), GOOD_BONUS])
+def test_cpu_directions_match_grid(state):
+    # Whatever the lookahead drawn, the CPU sees the same cell ahead on both engines.
+    batch = BatchGrid(1, 40, 40, CPUS, [], seed = 3)
+    mirror = Mirror(batch, CPUS)
+    snake = mirror.grid.snakes[0]
+    for direction in range(4):
+        batch.dir[0, 0] = snake.dir = direction
+        for distance in set(LOOKAHEAD):
+            x = (snake.x + DIR_X[direction] * distance) % batch.width
+            y = (snake.y + DIR_Y[direction] * distance) % batch.height
+            batch.ids[0, y, x] = state
+            mirror.grid.set_point(x, y, (state, 0))
+        for draw in range(100):
+            batch.select_new_direction(np.array([0]), 0)
+            snake.select_new_direction(mirror.grid)
+            assert batch.new_dir[0, 0] == snake.new_dir
+
+
+def test_batch_resets_ended_matches():
+    batch = BatchGrid(4, 72, 48, CPUS, DEFAULT_WALLS, True, seed = 1)
+    mirror = Mirror(batch, CPUS)
+    matches = 0
+    for tick in range(2000):
+        ended = batch.step()
+        mirror.grid.update_grid(True)
+        if ended[0]:
+            # The counters of the match which ended are kept, the new match starts from zero.
+            matches += 1
+            assert batch.matches[0] == matches
+            assert mirror.counters() == list(zip(batch.final_kill[0].tolist(), batch.final_dead[0].tolist(),
+                                                 batch.final_score[0].tolist())), tick
+            assert not batch.kill[0].any() and not batch.dead[0].any() and not batch.score[0].any()
+            mirror.restart()
+        mirror.check(tick)
+    assert matches >= 3
+    assert (batch.matches > 0).all()
@@ -0,0 +1,127 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+import pytest
+
+import cells
+import env
+from env import BatchEnv, PytronEnv
+from tournament import make_roster
+
+# Two agents, so that each one sees the other as another snake, on a grid small enough for matches to end quickly.
+ROSTER = make_roster(['human', 'cpu', 'human', 'drone'])
+WIDTH, HEIGHT = 30, 20
+
+
+def naive_obs(types: list, ids: np.ndarray, births: np.ndarray, tick: int, x: np.ndarray, y: np.ndarray,
+              crop: int = None) -> np.ndarray:
+    """
+    Observations of the agents of one game, read cell by cell.
+    """
+    agents = [s for s, snakeType in enumerate(types) if snakeType == 'human']
+    height, width = ids.shape
+    rows, cols = (height, width) if crop is None else (2 * crop + 1, 2 * crop + 1)
+    obs = np.zeros((len(agents), env.PLANES, rows, cols), dtype=np.float32)
+    for a, agent in enumerate(agents):
+        for row in range(rows):
+            for col in range(cols):
+                if crop is None:
+                    cx, cy = col, row
+                else:
+                    cx, cy = (x[agent] + col - crop) % width, (y[agent] + row - crop) % height
+                cell = int(ids[cy, cx])
+                kind = cell & cells.KIND
+                if cell == cells.WALL:
+                    plane = env.WALL
+                elif kind == cells.SNAKE:
+                    s = (cell >> cells.KIND_BITS) - 1
+                    plane = env.OWN if s == agent else env.DRONE if types[s] == 'drone' else env.OTHER
+                    obs[a, env.AGE, row, col] = min(1, (tick - int(births[cy, cx])) / env.MAX_AGE)
+                elif kind == cells.BONUS:
+                    plane = env.GOOD_BONUS if cell == cells.GOOD_BONUS else env.MILD_BONUS
+                else:
+                    plane = env.EMPTY
+                obs[a, plane, row, col] = 1
+        if crop is not None:
+            obs[a, env.HEAD, crop, crop] = 1
+        elif x[agent] >= 0:
+            obs[a, env.HEAD, y[agent], x[agent]] = 1
+    return obs
+
+
+@pytest.mark.parametrize('crop', [None, 4, 12], ids=['full', 'crop', 'wrapping_crop'])
+def test_batch_observations_match_cells(crop):
+    # A crop of 12 is higher than the grid, so its rows wrap around more than once.
+    types = [snakeType for snakeType, keys, color in ROSTER]
+    batch_env = BatchEnv(3, ROSTER, [], WIDTH, HEIGHT, single_life = True, max_ticks = 150, crop = crop)
+    obs = batch_env.reset(seed = 2)
+    rng = np.random.default_rng(2)
+    removed = 0
+    for tick in range(300):
+        batch = batch_env.batch
+        for g in range(batch_env.games):
+            expected = naive_obs(types, batch.ids[g], batch.births[g], batch.tick, batch.x[g], batch.y[g], crop)
+            assert np.allclose(obs[g], expected), (tick, g)
+        removed += np.count_nonzero(batch.x[:, batch_env.agents] < 0)
+        obs, rewards, dones = batch_env.step(rng.integers(0, 4, (batch_env.games, len(batch_env.agents))))
+    assert removed > 0
+
+
+@pytest.mark.parametrize('crop', [None, 4])
+def test_observations_match_cells(crop):
+    types = [snakeType for snakeType, keys, color in ROSTER]
+    pytron_env = PytronEnv(ROSTER, [], WIDTH, HEIGHT, single_life = True, crop = crop)
+    obs = pytron_env.reset(seed = 3)
+    rng = np.random.default_rng(3)
+    for tick in range(100):
+        grid = pytron_env.grid
+        ids, ages = grid.get_arrays()
+        x = [snake.x for snake in grid.snakes]
+        y = [snake.y for snake in grid.snakes]
+        expected = naive_obs(types, ids, grid.tick - ages, grid.tick, x, y, crop)
+        assert np.allclose(obs, expected), tick
+        obs, rewards, dones = pytron_env.step(rng.integers(0, 4, len(pytron_env.agents)))
+        if dones.all():
+            break
+
+
+def test_batch_rewards_are_counter_increases():
+    weights = np.array((1.0, -1.0, 0.5))
+    batch_env = BatchEnv(4, ROSTER, [], WIDTH, HEIGHT, single_life = True, max_ticks = 12, reward_weights = weights)
+    batch_env.reset(seed = 4)
+    batch = batch_env.batch
+    agents = batch_env.agents
+    counters = lambda: np.stack([batch.kill, batch.dead, batch.score], axis=-1)[:, agents].astype(np.float64)
+
+    # Counters of the games, kept before each reset: those of the matches ended, or of the episodes which ran out of ticks.
+    reset_games = batch.reset_games
+    kept = {}
+    def keeping_reset_games(games):
+        for g in np.flatnonzero(games):
+            kept[g] = counters()[g]
+        reset_games(games)
+    batch.reset_games = keeping_reset_games
+
+    rng = np.random.default_rng(4)
+    ended = timed_out = 0
+    totals = np.zeros((batch_env.games, len(agents)))
+    for tick in range(400):
+        before = counters()
+        matches = batch.matches.copy()
+        kept.clear()
+        obs, rewards, dones = batch_env.step(rng.integers(0, 4, (batch_env.games, len(agents))))
+        after = counters()
+        for g in kept:
+            after[g] = kept[g]
+        assert np.allclose(rewards, (after - before) @ weights), tick
+        assert sorted(kept) == np.flatnonzero(dones).tolist(), tick
+
+        # Over an episode, the rewards add up to the weighted counters it ended with.
+        totals += rewards
+        for g in np.flatnonzero(dones):
+            assert np.allclose(totals[g], kept[g] @ weights), tick
+            totals[g] = 0
+            assert not counters()[g].any()
+        ended += np.count_nonzero(batch.matches > matches)
+        timed_out += np.count_nonzero(dones & (batch.matches == matches))
+    assert ended > 0 and timed_out > 0
@@ -0,0 +1,169 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from random import Random
+import numpy as np
+import pytest
+
+from cells import EMPTY, WALL, SNAKE, BONUS, KIND, KIND_BITS, AGED, MAX_SNAKES, GOOD_BONUS, MILD_BONUS, snake_cell
+from pytron import ArrayGrid, Grid, make_game
+from tournament import make_roster
+
+ROSTER = make_roster(['cpu'] * 6 + ['drone'] * 2)
+
+
+@pytest.mark.parametrize('single_life', [False, True])
+def test_array_grid_matches_grid(single_life):
+    games = [make_game(60, 40, 0, 1, single_life = single_life, array_grid = array_grid, roster = ROSTER, seed = 7)
+             for array_grid in (False, True)]
+    for tick in range(400):
+        for game in games:
+            game.run_once()
+        (ids, ages), (array_ids, array_ages) = (game.grid.get_arrays() for game in games)
+        assert np.array_equal(ids, array_ids), tick
+        assert np.array_equal(ages, array_ages), tick
+    assert [(s.kill, s.dead, s.score) for s in games[0].grid.snakes] == \
+           [(s.kill, s.dead, s.score) for s in games[1].grid.snakes]
+
+
+@pytest.mark.parametrize('single_life', [False, True])
+def test_expiry_matches_full_sweep(single_life):
+    # The full grid sweep the bodies replaced: a snake cell expires when older than the tail of its snake
+    # or when its snake was reset, a bonus when older than the timeout, every other cell ages by one.
+    game = make_game(60, 40, 0, 1, single_life = single_life, roster = ROSTER, seed = 3)
+    grid = game.grid
+    expire_cells = grid.expire_cells
+
+    def checked_expire_cells():
+        ids, ages = (array.copy() for array in grid.get_arrays())
+        kinds = ids & KIND
+        owners = np.where(kinds == SNAKE, ids >> KIND_BITS, 0)
+        reset = np.array([False] + [snake.reset for snake in grid.snakes])
+        tails = np.array([0] + [snake.tail for snake in grid.snakes])
+        expired = ((kinds == SNAKE) & (reset[owners] | (ages > tails[owners]))) | \
+                  ((kinds == BONUS) & (ages > grid.bonus_timeout))
+        expire_cells()
+        after_ids, after_ages = grid.get_arrays()
+        assert np.array_equal(after_ids, np.where(expired, EMPTY, ids)), grid.tick
+        assert np.array_equal(after_ages, np.where(expired | (ids & AGED == 0), 0, ages + 1)), grid.tick
+
+    grid.expire_cells = checked_expire_cells
+    for tick in range(400):
+        game.run_once()
+
+
+def test_dirty_cells_only_tracked_when_observed():
+    game = make_game(60, 40, 0, 1, roster = ROSTER, seed = 1)
+    grid = game.grid
+    for tick in range(20):
+        game.run_once()
+    assert not grid.dirty and not grid.last_dirty
+
+    seen = []
+    grid.observers.append(seen.append)
+    ids = grid.get_arrays()[0].copy()
+    game.run_once()
+    changed = np.flatnonzero(grid.get_arrays()[0].reshape(-1) != ids.reshape(-1))
+    assert set(changed.tolist()) <= seen[0]
+
+
+def human_grid(heads: list) -> Grid:
+    # Human snakes nobody steers, so they keep going the way they are put, on an empty grid.
+    grid = Grid(24, 20, seed = 0)
+    for x, y, direction in heads:
+        grid.new_snake('human', (0, 0, 0, 0), 1)
+        snake = grid.snakes[-1]
+        grid.reset_point(snake.x, snake.y)
+        snake.body.clear()
+        snake.x = snake.new_x = x
+        snake.y = snake.new_y = y
+        snake.dir = snake.new_dir = direction
+        grid.place_snake(snake)
+    return grid
+
+
+@pytest.mark.parametrize('single_life', [False, True])
+def test_head_to_head(single_life):
+    # Both heads reach (6, 5) on the same tick, the second one also running into the head of the first.
+    grid = human_grid([(5, 5, 1), (7, 5, 3), (0, 10, 0)])
+    first, second, other = grid.snakes
+    grid.update_grid(single_life)
+    assert first.reset and second.reset and not other.reset
+    assert [(s.kill, s.dead) for s in grid.snakes] == [(1, 1), (0, 2), (0, 0)]
+
+
+def test_three_heads_on_one_cell():
+    grid = human_grid([(5, 5, 1), (7, 5, 3), (6, 4, 0)])
+    grid.update_grid(False)
+    assert all(snake.reset for snake in grid.snakes)
+    # Every head meets the previous ones, then runs into the head of the first on the grid.
+    assert [(s.kill, s.dead) for s in grid.snakes] == [(2, 2), (0, 3), (0, 3)]
+
+
+def test_removed_snakes_leave_no_head():
+    # The two first snakes are removed at (6, 5) on the first tick, the third one reaches it on the second.
+    grid = human_grid([(5, 5, 1), (7, 5, 3), (6, 7, 2)])
+    grid.update_grid(True)
+    grid.update_grid(True)
+    third = grid.snakes[2]
+    assert (third.x, third.y) == (6, 5)
+    assert not third.reset and third.dead == 0
+    assert grid.get_point(6, 5)[0] == third.cell
+
+
+@pytest.mark.parametrize('grid_class', [Grid, ArrayGrid])
+def test_cells_round_trip(grid_class):
+    grid = grid_class(8, 8, seed = 0)
+    grid.tick = 5
+    values = [(EMPTY, 0), (WALL, 0), (snake_cell(1), 0), (snake_cell(MAX_SNAKES), 4), (GOOD_BONUS, 5), (MILD_BONUS, 9)]
+    for x, value in enumerate(values):
+        grid.set_point(x, 0, value)
+    grid.tick = 6
+    assert [grid.get_point(x, 0) for x in range(len(values))] == [(state, age + 1 if state & AGED else 0) for state, age in values]
+
+
+def test_kill_by_a_high_id():
+    # 24 snakes drive right on the top rows, the last one moving off the cell the first one reaches.
+    grid = human_grid([(11, 14, 0)] + [(2 * (i % 8), 16 + i // 8, 1) for i in range(22)] + [(11, 15, 1)])
+    first, last = grid.snakes[0], grid.snakes[-1]
+    assert last.cell == snake_cell(24)
+    grid.update_grid(False)
+    assert first.reset and first.dead == 1
+    assert last.kill == 1 and sum(snake.kill for snake in grid.snakes) == 1
+
+
+@pytest.mark.parametrize('single_life', [False, True])
+def test_array_grid_matches_grid_with_many_snakes(single_life):
+    roster = make_roster(['cpu'] * 40 + ['drone'] * 10)
+    games = [make_game(120, 80, 0, 1, single_life = single_life, array_grid = array_grid, roster = roster, seed = 5)
+             for array_grid in (False, True)]
+    for tick in range(200):
+        for game in games:
+            game.run_once()
+        (ids, ages), (array_ids, array_ages) = (game.grid.get_arrays() for game in games)
+        assert np.array_equal(ids, array_ids), tick
+        assert np.array_equal(ages, array_ages), tick
+    assert [(s.kill, s.dead, s.score) for s in games[0].grid.snakes] == \
+           [(s.kill, s.dead, s.score) for s in games[1].grid.snakes]
+    assert sum(s.kill for s in games[0].grid.snakes[20:]) > 0
+
+
+@pytest.mark.parametrize('rewind_ratio', [1, 1 << 20])
+@pytest.mark.parametrize('array_grid', [False, True])
+def test_rewind_matches_grid(array_grid, rewind_ratio):
+    game = make_game(60, 40, 0, 1, array_grid = array_grid, roster = ROSTER, seed = 4)
+    game.run_headless(50)
+    grid = game.grid
+    grid.rewind_ratio = rewind_ratio
+    ids, ages = (array.copy() for array in grid.get_arrays())
+    sim = grid.scratch(Random(0))
+    for rollout in range(5):
+        for tick in range(30):
+            sim.show_bonus()
+            sim.update_grid(False)
+        grid.rewind(sim, Random(rollout))
+        assert np.array_equal(sim.get_arrays()[0], ids) and np.array_equal(sim.get_arrays()[1], ages)
+        assert sorted(sim.free) == sorted(grid.free)
+        assert all(sim.free_pos[cell] == sim.free.index(cell) for cell in sim.free[:50])
+        assert [(s.x, s.y, s.tail, list(s.body)) for s in sim.snakes] == [(s.x, s.y, s.tail, list(s.body)) for s in grid.snakes]
+        assert (sim.tick, list(sim.bonus_cells)) == (grid.tick, list(grid.bonus_cells))
+    assert np.array_equal(grid.get_arrays()[0], ids)
@@ -0,0 +1,69 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+import pytest
+
+from pytron import make_game
+from tournament import make_roster
+
+ROSTER = make_roster(['mcts', 'mcts', 'cpu', 'cpu', 'drone'])
+
+
+def bounded_game(array_grid: bool = False, decision_workers: int = None):
+    # Searches bounded by their number of rollouts only, so that games are reproducible.
+    game = make_game(40, 30, 0, 1, array_grid = array_grid, roster = ROSTER, seed = 6, decision_workers = decision_workers)
+    for snake in game.grid.snakes:
+        if snake.type == 'mcts':
+            snake.planner.time_budget = None
+            snake.planner.max_rollouts = 8
+    return game
+
+
+@pytest.mark.parametrize('decision_workers', [None, 2])
+def test_bounded_searches_are_reproducible(decision_workers):
+    games = [bounded_game(), bounded_game(decision_workers = decision_workers)]
+    moves = [[], []]
+    for tick in range(30):
+        for game, played in zip(games, moves):
+            game.run_once()
+            played.append([snake.dir for snake in game.grid.snakes])
+    games[1].close()
+    assert moves[0] == moves[1]
+    assert np.array_equal(games[0].grid.get_arrays()[0], games[1].grid.get_arrays()[0])
+
+
+def test_tree_is_reused():
+    game = bounded_game()
+    snake = game.grid.snakes[0]
+    planner = snake.planner
+    for tick in range(30):
+        game.run_once()
+        root = planner.root
+        assert planner.root_tick == game.grid.tick
+        if snake.reset:
+            continue
+        visits = root.visits
+        game.run_once()
+        # The subtree of the move taken became the root of the next search, which added its rollouts to it.
+        assert root.visits == visits + planner.max_rollouts
+        assert planner.root is root.children[snake.dir]
+        return
+    pytest.fail("The snake never survived a tick.")
+
+
+@pytest.mark.parametrize('array_grid', [False, True])
+def test_search_leaves_grid_untouched(array_grid):
+    game = bounded_game(array_grid)
+    game.run_headless(20)
+    grid = game.grid
+    ids, ages = (array.copy() for array in grid.get_arrays())
+    free = sorted(grid.free)
+    snakes = [(s.x, s.y, s.dir, s.tail, s.kill, s.dead, s.score, list(s.body)) for s in grid.snakes]
+    state = (grid.tick, list(grid.bonus_cells), grid.random.getstate())
+    for snake in grid.snakes:
+        if snake.type == 'mcts':
+            snake.planner.search(grid, snake)
+    assert np.array_equal(grid.get_arrays()[0], ids) and np.array_equal(grid.get_arrays()[1], ages)
+    assert sorted(grid.free) == free
+    assert [(s.x, s.y, s.dir, s.tail, s.kill, s.dead, s.score, list(s.body)) for s in grid.snakes] == snakes
+    assert (grid.tick, list(grid.bonus_cells), grid.random.getstate()) == state
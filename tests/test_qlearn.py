@@ -0,0 +1,68 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import warnings
+import numpy as np
+import pytest
+
+from cells import WALL, GOOD_BONUS, snake_cell
+from pytron import Grid, make_game
+from qlearn import ACTIONS, STATES, QLearner, QTable, encode, train
+from tournament import make_roster
+
+
+def test_encode():
+    grid = Grid(20, 20, seed = 0)
+    grid.new_snake('human', (0, 0, 0, 0), 1)
+    snake = grid.snakes[0]
+    grid.reset_point(snake.x, snake.y)
+    snake.body.clear()
+    snake.x, snake.y, snake.dir = 10, 10, 0
+    grid.place_snake(snake)
+    # A wall 3 cells ahead, another snake on the right, nothing on the left and a bonus behind.
+    grid.set_point(10, 13, (WALL, 0))
+    grid.set_point(11, 10, (snake_cell(2), 0))
+    grid.place_bonus(10, 5, GOOD_BONUS)
+    assert encode(grid, snake) == ((2 * 5 + 0) * 5 + 4) * 5 + 3
+
+    # The same cells, seen by a snake going left.
+    snake.dir = 3
+    assert encode(grid, snake) == ((4 * 5 + 2) * 5 + 4) * 5 + 4
+
+    # Bonuses which are gone are not looked for.
+    grid.reset_point(10, 5)
+    assert encode(grid, snake) % 5 == 0
+
+
+def test_table_round_trip(tmp_path):
+    path = str(tmp_path / 'qtable.npy')
+    assert QTable.load(path) is None
+
+    table = QTable(np.random.default_rng(0).random((STATES, ACTIONS), dtype=np.float32))
+    table.save(path)
+    loaded = QTable.load(path)
+    assert np.array_equal(loaded.values, table.values)
+    assert [loaded.best(state) for state in range(STATES)] == np.argmax(table.values, axis=1).tolist()
+    assert QTable.load(path) is loaded
+
+    # Saving again replaces the table shared by the next loads.
+    QTable(np.zeros((STATES, ACTIONS), dtype=np.float32)).save(path)
+    assert not QTable.load(path).values.any()
+
+
+def test_missing_table_plays_as_cpu(monkeypatch):
+    monkeypatch.setattr(QTable, 'load', classmethod(lambda cls, path = None: None))
+    with pytest.warns(UserWarning):
+        game = make_game(arena_border = 0, roster = make_roster(['qcpu', 'cpu']), seed = 0)
+    assert [(snake.type, snake.planner) for snake in game.grid.snakes] == [('cpu', None), ('cpu', None)]
+
+
+def test_train_learns_into_the_table():
+    table = train(QTable(), games = 1, ticks = 300)
+    assert table.values.any()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        game = make_game(arena_border = 0, roster = make_roster(['qcpu']), seed = 0,
+                         planners = {'qcpu': lambda grid, snake: QLearner(table)})
+    planner = game.grid.snakes[0].planner
+    assert planner.table is table and not planner.learning
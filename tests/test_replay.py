@@ -0,0 +1,40 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+import pytest
+
+from pytron import make_game
+from replay import Recorder, Replay
+from tournament import make_roster
+
+FIELDS = ('x', 'y', 'dir', 'tail', 'kill', 'dead', 'score', 'reset')
+
+
+def snapshot(grid) -> tuple:
+    """
+    Returns the cells and the snakes of a grid, to compare grids.
+        :param grid:Grid: Grid of the game.
+    """
+    ids, ages = grid.get_arrays()
+    return (grid.tick, ids.copy(), ages.copy(), [tuple(getattr(snake, field) for field in FIELDS) for snake in grid.snakes])
+
+
+@pytest.mark.parametrize('single_life,array_grid', [(False, False), (True, False), (False, True)])
+def test_grid_at_matches_recorded_game(tmp_path, single_life, array_grid):
+    path = str(tmp_path / 'game.rpl')
+    game = make_game(50, 40, 0, 1, single_life = single_life, roster = make_roster(['cpu'] * 4 + ['drone'] * 2), seed = 4)
+    recorder = Recorder(game.grid, path, single_life, keyframe_interval = 32)
+    live = [snapshot(game.grid)]
+    for tick in range(150):
+        game.run_once()
+        live.append(snapshot(game.grid))
+    recorder.close()
+
+    replay = Replay(path)
+    assert replay.ticks == 150
+    for tick in list(range(0, 151, 7)) + [31, 32, 33, 150]:
+        tick_number, ids, ages, snakes = snapshot(replay.grid_at(tick, array_grid))
+        assert tick_number == live[tick][0]
+        assert np.array_equal(ids, live[tick][1]), tick
+        assert np.array_equal(ages, live[tick][2]), tick
+        assert snakes == live[tick][3], tick
@@ -0,0 +1,78 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+import numpy as np
+import pytest
+
+from cells import WALL, SNAKE, KIND, AGED, id_count
+from pytron import make_game
+from space import NEVER, Territory, VoronoiFill
+from tournament import make_roster
+
+
+@pytest.mark.parametrize('array_grid', [False, True])
+def test_flood_mirror_follows_grid(array_grid):
+    game = make_game(40, 30, 0, 1, array_grid = array_grid, roster = make_roster(['flood', 'flood', 'cpu', 'drone']), seed = 2)
+    grid = game.grid
+    planners = [snake.planner for snake in grid.snakes if snake.type == 'flood']
+    assert planners[0].territory is planners[1].territory
+    territory = planners[0].territory
+    for tick in range(150):
+        game.run_once()
+        # The mirrors were synced during the decisions of this tick, before the bonus of the next one.
+        grid.show_bonus()
+        territory.sync(grid)
+        ids, ages = grid.get_arrays()
+        assert np.array_equal(territory.ids, ids), tick
+        aged = (ids & AGED) != 0
+        assert np.array_equal(territory.births[aged], (grid.tick - ages)[aged]), tick
+
+
+def fresh_floods(waits: np.ndarray, sources: list, step: int, horizon: int) -> np.ndarray:
+    # Floods over the whole wrapping grid, for every step up to the horizon.
+    steps = np.full((len(sources),) + waits.shape, horizon + 1)
+    for layer, (x, y) in enumerate(sources):
+        steps[layer, y, x] = step
+    for depth in range(step + 1, horizon + 1):
+        reached = steps <= horizon
+        grown = reached | np.roll(reached, 1, 1) | np.roll(reached, -1, 1) | np.roll(reached, 1, 2) | np.roll(reached, -1, 2)
+        steps[grown & ~reached & (waits <= depth)] = depth
+    return steps
+
+
+def fresh_values(grid, snake, horizon: int) -> list:
+    # Values of the moves of a snake from floods of the whole grid, read again from it.
+    ids, ages = grid.get_arrays()
+    tails = np.zeros(id_count(len(grid.snakes)), dtype=np.int64)
+    for other in grid.snakes:
+        tails[other.cell] = other.tail
+    waits = np.where(ids & KIND == SNAKE, tails[ids] - ages + 3, 0)
+    waits[ids == WALL] = NEVER
+
+    heads = [(other.x, other.y) for other in grid.snakes if other is not snake and other.type != 'drone' and other.x >= 0]
+    others = fresh_floods(waits, heads, 0, horizon).min(axis=0, initial=horizon + 1)
+    directions = (snake.dir, (snake.dir + 1) % 4, (snake.dir + 3) % 4)
+    candidates = [(grid.ahead[1][d][0][snake.x], grid.ahead[1][d][1][snake.y]) for d in directions]
+    steps = fresh_floods(waits, candidates, 1, horizon)
+    values = []
+    for mine, direction, (x, y) in zip(steps, directions, candidates):
+        if waits[y, x] > 1:
+            values.append((direction, (-1, 0)))
+        else:
+            owned = int(np.count_nonzero(mine < others))
+            values.append((direction, (owned // 2 if others[y, x] <= 1 else owned, int(np.count_nonzero(mine <= horizon)))))
+    return values
+
+
+@pytest.mark.parametrize('width,height,horizon', [(40, 30, 24), (90, 70, 24), (40, 30, 6)])
+def test_shared_floods_match_fresh_floods(width, height, horizon):
+    # Heads flooded once per tick on windows of the grid mirrored incrementally, against floods of the whole grid.
+    territory = Territory(horizon)
+    game = make_game(width, height, 0, 1, walls = [((5, 5), (20, 6))], roster = make_roster(['flood'] * 3 + ['cpu'] * 3 + ['drone']),
+                     seed = 8, planners = {'flood': lambda grid, snake: VoronoiFill(territory)})
+    grid = game.grid
+    for tick in range(50):
+        grid.show_bonus()
+        for snake in grid.snakes:
+            if snake.type == 'flood' and snake.x >= 0:
+                assert snake.planner.values(grid, snake) == fresh_values(grid, snake, horizon), tick
+        grid.update_grid(False)
@@ -0,0 +1,162 @@
+# Source code released under gpl v3 licence, see COPYING file
+
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist, mean, stdev
+import argparse
+import os
+
+from pytron import DEFAULT_WALLS, make_game
+
+# Counters of a snake aggregated by the tournament.
+COUNTERS = ('kill', 'dead', 'score')
+
+
+def make_roster(types: list) -> list:
+    """
+    Builds a roster for make_game from a list of snake types.
+        :param types:list: Types of the snakes, such as 'cpu' or 'drone'.
+    """
+    return [(snakeType, (0, 0, 0, 0), 8 if snakeType == 'drone' else i % 7 + 1) for i, snakeType in enumerate(types)]
+
+
+def play_match(match: tuple) -> list:
+    """
+    Plays one headless match and returns the (kill, dead, score) counters of each snake.
+    Runs into the worker processes, so it only takes and returns picklable values.
+        :param match:tuple: (types, walls, ticks, seed, single_life, arena_width, arena_height, square_size).
+    """
+    types, walls, ticks, seed, single_life, arena_width, arena_height, square_size = match
+    with make_game(arena_width, arena_height, 0, square_size, single_life = single_life, walls = walls,
+                   roster = make_roster(types), seed = seed) as game:
+        stop = None
+        if single_life:
+            players = [snake for snake in game.grid.snakes if snake.type != 'drone']
+            left = min(2, len(players))
+            stop = lambda game: sum(1 for snake in players if not snake.reset) < left
+        game.run_headless(ticks, stop)
+        return [(snake.kill, snake.dead, snake.score) for snake in game.grid.snakes]
+
+
+def summarize(values: list, confidence: float = 0.95) -> tuple:
+    """
+    Returns the mean of values and the half width of its confidence interval, using the normal approximation.
+    Both are NaN without any value.
+        :param values:list: Values measured on each match.
+        :param confidence:float: Confidence level of the interval.
+    """
+    if not values:
+        return (float('nan'), float('nan'))
+    if len(values) < 2:
+        return (mean(values), float('nan'))
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return (mean(values), z * stdev(values) / len(values) ** 0.5)
+
+
+class Tournament:
+
+    def __init__(self, types: list, walls: list = DEFAULT_WALLS, ticks: int = 2000, seeds: list = range(100),
+                 single_life: bool = False, arena_width: int = 720, arena_height: int = 480, square_size: int = 10):
+        """
+        Describes a tournament: the same match played once for each seed.
+            :param self:
+            :param types:list: Types of the snakes, such as 'cpu' or 'drone'.
+            :param walls:list: Walls, as (bottom_left, top_right) tuples given to Grid.new_wall.
+            :param ticks:int: Maximum number of ticks of a match.
+            :param seeds:list: Seeds of the matches.
+            :param single_life:bool: Whether snakes are removed on their first death, matches then end with the last player.
+            :param arena_width:int: Width of the arena in pixels.
+            :param arena_height:int: Height of the arena in pixels.
+            :param square_size:int: Size of a cell in pixels.
+        """
+        self.types = list(types)
+        self.walls = walls
+        self.ticks = ticks
+        self.seeds = list(seeds)
+        self.single_life = single_life
+        self.arena_width = arena_width
+        self.arena_height = arena_height
+        self.square_size = square_size
+        # Counters of each match, indexed by [match][snake], as (kill, dead, score) tuples.
+        self.results = []
+
+    def run(self, workers: int = None):
+        """
+        Plays every match over a pool of processes, one per CPU core by default.
+            :param self:
+            :param workers:int: Number of processes.
+        """
+        matches = [(self.types, self.walls, self.ticks, seed, self.single_life,
+                    self.arena_width, self.arena_height, self.square_size) for seed in self.seeds]
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(matches) // (4 * workers))
+        with ProcessPoolExecutor(workers) as pool:
+            self.results = list(pool.map(play_match, matches, chunksize = chunksize))
+
+    def snake_table(self, confidence: float = 0.95) -> list:
+        """
+        Returns one row per snake of the roster: (snake label, {counter: (mean, half width)}).
+            :param self:
+            :param confidence:float: Confidence level of the intervals.
+        """
+        rows = []
+        for i, snakeType in enumerate(self.types):
+            stats = {}
+            for c, counter in enumerate(COUNTERS):
+                stats[counter] = summarize([match[i][c] for match in self.results], confidence)
+            rows.append(("%d %s" % (i + 1, snakeType), stats))
+        return rows
+
+    def type_table(self, confidence: float = 0.95) -> list:
+        """
+        Returns one row per snake type: (type, {counter: (mean, half width)}).
+        The counters of the snakes of a type are averaged on each match, so matches stay the samples.
+            :param self:
+            :param confidence:float: Confidence level of the intervals.
+        """
+        rows = []
+        for snakeType in sorted(set(self.types)):
+            slots = [i for i, t in enumerate(self.types) if t == snakeType]
+            stats = {}
+            for c, counter in enumerate(COUNTERS):
+                stats[counter] = summarize([mean(match[i][c] for i in slots) for match in self.results], confidence)
+            rows.append((snakeType, stats))
+        return rows
+
+    def format_table(self, rows: list) -> str:
+        """
+        Formats a table returned by snake_table or type_table as text.
+            :param self:
+            :param rows:list: Rows of the table.
+        """
+        lines = ["%-12s" % "" + "".join("%20s" % counter.upper() for counter in COUNTERS)]
+        for label, stats in rows:
+            lines.append("%-12s" % label + "".join("%12.2f +-%6.2f" % stats[counter] for counter in COUNTERS))
+        return "\n".join(lines)
+
+
+def positive(text: str) -> int:
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("%s is not at least 1" % text)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays many headless matches and compares the snakes.")
+    parser.add_argument("types", nargs="+", help="types of the snakes, such as cpu or drone")
+    parser.add_argument("--ticks", type=int, default=2000, help="maximum number of ticks of a match")
+    parser.add_argument("--seeds", type=positive, default=100, help="number of matches, seeded from 0")
+    parser.add_argument("--single-life", action="store_true", help="remove snakes on their first death")
+    parser.add_argument("--no-walls", action="store_true", help="play without the default walls")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, one per core by default")
+    args = parser.parse_args()
+
+    tournament = Tournament(args.types, [] if args.no_walls else DEFAULT_WALLS, args.ticks, range(args.seeds), args.single_life)
+    tournament.run(args.workers)
+    print(tournament.format_table(tournament.snake_table()))
+    print()
+    print(tournament.format_table(tournament.type_table()))
+
+
+if __name__ == "__main__":
+    main()